@@ -2,15 +2,34 @@
 arpd_update focuses on easily editing the assume role policy document of a role.
 """
 import os
+import re
+import sys
 import json
+import hashlib
 import logging
+import time
 import argparse
 from datetime import datetime
 
-from typing import List, Dict, Optional
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple
+
+# the boto3 import is reported as a phase by --profile; it is only measured for
+# the CLI entry point, as it is near 0 once another module imported boto3
+_IMPORT_STARTED = (time.perf_counter(), time.process_time())
+# pylint: disable=wrong-import-position
 import boto3  # type: ignore
 from botocore.exceptions import ClientError  # type: ignore
 
+BOTO3_IMPORT_TIME = (
+    time.perf_counter() - _IMPORT_STARTED[0],
+    time.process_time() - _IMPORT_STARTED[1],
+)
+
+from trustyroles.arpd_update.output import OUTPUT_FORMATS, make_result, write_result
+from trustyroles.arpd_update.profiling import phase, profile
+
+# pylint: enable=wrong-import-position
+
 LOGGER = logging.getLogger("IAM-ROLE-TRUST-POLICY")
 logging.basicConfig(level=logging.WARNING)
 PARSER = argparse.ArgumentParser()
@@ -19,6 +38,8 @@ PARSER = argparse.ArgumentParser()
 def _main():
     """The _main method can take in a list of ARNs, role to update,
         and method [get, update, remove, restore]."""
+    parse_started = (time.perf_counter(), time.process_time())
+
     PARSER.add_argument(
         "-a",
         "--arn",
@@ -31,7 +52,7 @@ def _main():
         "-u",
         "--update_role",
         type=str,
-        required=True,
+        required=False,
         help="Role for updating trust policy. Takes an role friendly name as string.",
     )
 
@@ -40,8 +61,19 @@ def _main():
         "--method",
         type=str,
         required=False,
-        choices=["get", "update", "remove", "restore"],
-        help="Takes choice of method to get, update, or remove.",
+        choices=[
+            "get",
+            "update",
+            "remove",
+            "restore",
+            "compact",
+            "refresh",
+            "find",
+            "rollback",
+        ],
+        help="""Takes choice of method to get, update, remove, restore,
+    compact backups of --backup_policy location, refresh the --snapshot,
+    find roles in the --snapshot trusting --arn or rollback the --journal.""",
     )
 
     PARSER.add_argument(
@@ -116,8 +148,215 @@ def _main():
         help="S3 key name for restoring S3 policy. Takes a string",
     )
 
+    PARSER.add_argument(
+        "--batch",
+        type=str,
+        required=False,
+        help="""JSONL file of records to apply, or - for stdin. Each record
+    takes the argument names as keys, e.g. update_role, method and arn""",
+    )
+
+    PARSER.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        required=False,
+        help="Number of concurrent workers for batch mode and bulk restore. Takes an int",
+    )
+
+    PARSER.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        required=False,
+        choices=OUTPUT_FORMATS,
+        help="""Output format. text is the default for a single role,
+    ndjson (one compact JSON record per role and operation) for batch mode""",
+    )
+
+    PARSER.add_argument(
+        "--keep_last",
+        type=int,
+        required=False,
+        help="Number of backup versions per role kept by compact. Takes an int",
+    )
+
+    PARSER.add_argument(
+        "--max_age_days",
+        type=int,
+        required=False,
+        help="Age in days after which compact drops backup versions. Takes an int",
+    )
+
+    PARSER.add_argument(
+        "--snapshot",
+        type=str,
+        required=False,
+        help="""Path to a local snapshot file of the account's trust policies,
+    used by get, find and refresh. Takes a string""",
+    )
+
+    PARSER.add_argument(
+        "--max_staleness",
+        type=int,
+        required=False,
+        help="Age in seconds after which get ignores the snapshot. Takes an int",
+    )
+
+    PARSER.add_argument(
+        "--restore_time",
+        type=str,
+        required=False,
+        help="""Restores -u/--update_role, the selected roles or every role
+    with backups, to its policy at this <ISO-time> from the --backup_policy location. Takes a string""",
+    )
+
+    PARSER.add_argument(
+        "--journal",
+        type=str,
+        required=False,
+        help="""Undo journal file of the previous policy of every role changed in
+    batch mode, kept across batches until rolled back with -m rollback.
+    Takes a string""",
+    )
+
+    PARSER.add_argument(
+        "--rollback_on_error",
+        action="store_true",
+        required=False,
+        help="Stops batch mode and rolls back every changed role on the first error.",
+    )
+
+    PARSER.add_argument(
+        "--profile",
+        action="store_true",
+        required=False,
+        help="Writes wall and CPU time per phase and the hot paths to stderr.",
+    )
+
+    PARSER.add_argument(
+        "--profile_dump",
+        type=str,
+        required=False,
+        help="Profiles like --profile and dumps cProfile stats to a file. Takes a string",
+    )
+
+    PARSER.add_argument(
+        "--path_prefix",
+        type=str,
+        required=False,
+        help="""Selects the roles under an IAM path, e.g. /service/, instead of
+    -u/--update_role. Also limits refresh of the --snapshot. Takes a string""",
+    )
+
+    PARSER.add_argument(
+        "--role_glob",
+        type=str,
+        required=False,
+        help="Selects the roles with names matching a glob, e.g. 'app-*'. Takes a string",
+    )
+
+    PARSER.add_argument(
+        "--role_regex",
+        type=str,
+        required=False,
+        help="Selects the roles with names matching a regex. Takes a string",
+    )
+
+    PARSER.add_argument(
+        "--tag",
+        action="append",
+        required=False,
+        help="""Selects the roles tagged KEY=VALUE, or KEY with any value.
+    Can be repeated, roles must have every tag. Takes a string""",
+    )
+
     args = vars(PARSER.parse_args())
 
+    if args["workers"] < 1:
+        PARSER.error("--workers must be at least 1")
+
+    if args["restore_time"]:
+        from trustyroles.arpd_update.retention import TIME_FORMAT
+
+        if args["method"] != "restore":
+            PARSER.error("--restore_time requires -m restore")
+
+        try:
+            datetime.strptime(args["restore_time"], TIME_FORMAT)
+        except ValueError:
+            PARSER.error(
+                "--restore_time must be an <ISO-time> like 2020-01-01T00:00:00Z"
+            )
+
+    if args["method"] == "rollback":
+        if not args["journal"]:
+            PARSER.error("rollback requires --journal")
+    elif args["method"] == "compact" or args["restore_time"]:
+        if not args["backup_policy"]:
+            PARSER.error(f"{args['method']} requires --backup_policy local or s3")
+    elif args["method"] in ["refresh", "find"]:
+        if not args["snapshot"]:
+            PARSER.error(f"{args['method']} requires --snapshot")
+        if args["method"] == "find" and not args["arn"]:
+            PARSER.error("find requires --arn")
+    elif not args["update_role"] and not args["batch"] and not _selects_roles(args):
+        PARSER.error(
+            "one of the arguments -u/--update_role --batch --path_prefix "
+            "--role_glob --role_regex --tag is required"
+        )
+
+    if args["role_regex"]:
+        try:
+            re.compile(args["role_regex"])
+        except re.error as error:
+            PARSER.error(f"--role_regex is not a valid regex: {error}")
+
+    if args["method"] == "refresh":
+        if args["role_glob"] or args["role_regex"] or args["tag"]:
+            PARSER.error("refresh only takes --path_prefix to select roles")
+    elif _selects_roles(args):
+        if args["method"] in ["compact", "find", "rollback"]:
+            PARSER.error(
+                "--path_prefix --role_glob --role_regex --tag "
+                f"cannot be combined with -m {args['method']}"
+            )
+
+        if args["method"] == "restore" and not args["restore_time"]:
+            PARSER.error(
+                "--path_prefix --role_glob --role_regex --tag "
+                "require --restore_time with -m restore"
+            )
+
+        if args["update_role"] or args["batch"]:
+            PARSER.error(
+                "--path_prefix --role_glob --role_regex --tag "
+                "cannot be combined with -u/--update_role or --batch"
+            )
+
+        if not args["method"] and not any(
+            args[key]
+            for key in [
+                "add_external_id",
+                "remove_external_id",
+                "add_sid",
+                "remove_sid",
+            ]
+        ):
+            PARSER.error(
+                "selecting roles requires -m/--method or one of the arguments "
+                "--add_external_id --remove_external_id --add_sid --remove_sid"
+            )
+
+    if args["profile"] or args["profile_dump"]:
+        _main_profiled(args, parse_started=parse_started)
+    else:
+        _run(args)
+
+
+def _run(args: Dict) -> None:
+    """Runs the methods selected by the parsed arguments."""
+
     if args["backup_policy"]:
         if args["backup_policy"] == "local":
             if args["dir_path"]:
@@ -133,105 +372,398 @@ def _main():
         dir_path = os.getcwd()
         bucket = ""
 
+    if args["output"]:
+        output_format = args["output"]
+    elif (
+        args["batch"]
+        or (_selects_roles(args) and not args["update_role"])
+        or args["method"] in ["find", "rollback"]
+        or args["restore_time"]
+    ):
+        output_format = "ndjson"
+    else:
+        output_format = "text"
+
+    if args["batch"]:
+        _main_batch(args, dir_path=dir_path, bucket=bucket, output_format=output_format)
+        return
+
+    if args["method"] == "rollback":
+        _main_rollback(args, output_format=output_format)
+        return
+
+    if args["method"] == "compact":
+        _main_compact(
+            args, dir_path=dir_path, bucket=bucket, output_format=output_format
+        )
+        return
+
+    if args["method"] in ["refresh", "find"]:
+        _main_snapshot(args, output_format=output_format)
+        return
+
+    if args["method"] == "restore" and args["restore_time"]:
+        _main_bulk_restore(
+            args, dir_path=dir_path, bucket=bucket, output_format=output_format
+        )
+        return
+
+    if not args["update_role"] and _selects_roles(args):
+        _main_select(
+            args, dir_path=dir_path, bucket=bucket, output_format=output_format
+        )
+        return
+
+    role_name = args["update_role"]
+
     if args["method"] == "update":
+        started = time.perf_counter()
         arpd = update_arn(
-            args["arn"],
-            args["update_role"],
+            role_name=role_name,
+            arn_list=args["arn"],
             dir_path=dir_path,
             bucket=bucket,
             backup_policy=args["backup_policy"],
         )
 
-        print(json.dumps(arpd["Statement"][0], indent=4))
+        write_result(make_result(role_name, "update", started, arpd), output_format)
     elif args["method"] == "remove":
+        started = time.perf_counter()
         arpd = remove_arn(
-            args["arn"],
-            args["update_role"],
+            role_name=role_name,
+            arn_list=args["arn"],
             dir_path=dir_path,
             bucket=bucket,
             backup_policy=args["backup_policy"],
         )
 
-        print(json.dumps(arpd["Statement"][0], indent=4))
+        write_result(make_result(role_name, "remove", started, arpd), output_format)
     elif args["method"] == "get":
-        arpd = get_arpd(args["update_role"])
-        if args["json"]:
-            print(json.dumps(arpd["Statement"][0], indent=4))
+        started = time.perf_counter()
+        arpd = _snapshot_get_arpd(args, role_name) if args["snapshot"] else None
 
-        else:
-            print(f"\nARNS:")
-
-            if isinstance(arpd["Statement"][0]["Principal"]["AWS"], list):
-                for arn in arpd["Statement"][0]["Principal"]["AWS"]:
-                    print(f"  {arn}")
-            else:
-                print(f"  {arpd['Statement'][0]['Principal']['AWS']}")
-
-            print(f"Conditions:")
-
-            if arpd["Statement"][0]["Condition"]:
-                print(f"  {arpd['Statement'][0]['Condition']}")
+        if arpd is None:
+            arpd = get_arpd(role_name)
 
+        write_result(
+            make_result(role_name, "get", started, arpd),
+            output_format,
+            arns_only=not args["json"],
+        )
     elif args["method"] == "restore" and args["backup_policy"]:
+        started = time.perf_counter()
         if args["backup_policy"].lower() == "local" and args["file_path"]:
             arpd = restore_from_backup(
-                role_name=args["update_role"],
+                role_name=role_name,
                 location_type="local",
                 file_path=args["file_path"],
             )
         elif args["backup_policy"].lower() == "s3":
             arpd = restore_from_backup(
-                role_name=args["update_role"],
+                role_name=role_name,
                 location_type="s3",
                 file_path="",
                 key=args["key"],
                 bucket=bucket,
-                backup_policy=args["backup_policy"],
             )
 
-        print(json.dumps(arpd["Statement"][0], indent=4))
+        write_result(make_result(role_name, "restore", started, arpd), output_format)
 
     if args["add_external_id"]:
+        started = time.perf_counter()
         arpd = add_external_id(
             external_id=args["add_external_id"],
-            role_name=args["update_role"],
+            role_name=role_name,
             dir_path=dir_path,
             bucket=bucket,
             backup_policy=args["backup_policy"],
         )
 
-        print(json.dumps(arpd["Statement"][0], indent=4))
+        write_result(
+            make_result(role_name, "add_external_id", started, arpd), output_format
+        )
 
     if args["remove_external_id"]:
+        started = time.perf_counter()
         arpd = remove_external_id(
-            role_name=args["update_role"],
+            role_name=role_name,
             dir_path=dir_path,
             bucket=bucket,
             backup_policy=args["backup_policy"],
         )
 
-        print(json.dumps(arpd["Statement"][0], indent=4))
+        write_result(
+            make_result(role_name, "remove_external_id", started, arpd), output_format
+        )
 
     if args["add_sid"]:
+        started = time.perf_counter()
         arpd = add_sid(
-            role_name=args["update_role"],
+            role_name=role_name,
             sid=args["add_sid"],
             dir_path=dir_path,
             bucket=bucket,
-            backup_policy=args["backup_policy"],
+            backup_policy=args["backup_policy"] or "",
         )
 
-        print(json.dumps(arpd["Statement"][0], indent=4))
+        write_result(make_result(role_name, "add_sid", started, arpd), output_format)
 
     if args["remove_sid"]:
+        started = time.perf_counter()
         arpd = remove_sid(
-            role_name=args["update_role"],
+            role_name=role_name,
+            dir_path=dir_path,
+            bucket=bucket,
+            backup_policy=args["backup_policy"] or "",
+        )
+
+        write_result(make_result(role_name, "remove_sid", started, arpd), output_format)
+
+
+def _main_profiled(args: Dict, parse_started: Tuple[float, float]) -> None:
+    """Runs the arguments under a profiler, writing its report to stderr."""
+
+    profiler = profile(dump_path=args["profile_dump"], cprofile=True)
+
+    try:
+        with profiler:
+            profiler.add("import boto3 (CLI, within startup)", *BOTO3_IMPORT_TIME)
+            profiler.add(
+                "parse arguments",
+                time.perf_counter() - parse_started[0],
+                time.process_time() - parse_started[1],
+            )
+
+            with phase("credentials"):
+                boto3.DEFAULT_SESSION.get_credentials()
+
+            _run(args)
+    finally:
+        print(profiler.report(), file=sys.stderr)
+
+
+def _main_batch(
+    args: Dict,
+    dir_path: Optional[str],
+    bucket: Optional[str],
+    output_format: str,
+    records: Optional[Iterable[Dict]] = None,
+) -> None:
+    """
+    Streams records, or the records read from --batch, through run_batch,
+    writing each result as it completes.
+    """
+    # imported here as batch imports this module
+    from trustyroles.arpd_update.batch import read_records, run_batch
+    from trustyroles.arpd_update.journal import UndoJournal
+
+    stream = None
+
+    if records is None and args["batch"] == "-":
+        records = read_records(sys.stdin)
+    elif records is None:
+        stream = open(args["batch"], "r")
+        records = read_records(stream)
+
+    if args["journal"] and os.path.exists(args["journal"]):
+        journal = UndoJournal.load(args["journal"])
+    elif args["journal"]:
+        journal = UndoJournal(args["journal"])
+    else:
+        journal = None
+
+    failed = False
+
+    try:
+        for result in run_batch(
+            records,
+            max_workers=args["workers"],
             dir_path=dir_path,
             bucket=bucket,
             backup_policy=args["backup_policy"],
+            journal=journal,
+            rollback_on_error=args["rollback_on_error"],
+        ):
+            failed = failed or result["status"] != "ok"
+            write_result(result, output_format)
+    finally:
+        if stream:
+            stream.close()
+        if journal:
+            journal.close()
+
+    if failed:
+        sys.exit(1)
+
+
+def _selects_roles(args: Dict) -> bool:
+    return any(args[key] for key in ["path_prefix", "role_glob", "role_regex", "tag"])
+
+
+def _selected_roles(args: Dict) -> Iterator[Dict]:
+    """Streams the roles selected by --path_prefix, --role_glob, --role_regex and --tag."""
+    from trustyroles.arpd_update.selection import list_roles, parse_tags, select_roles
+
+    iam_client = boto3.client("iam")
+
+    return select_roles(
+        list_roles(args["path_prefix"] or "/", client=iam_client),
+        name_glob=args["role_glob"],
+        name_regex=args["role_regex"],
+        tags=parse_tags(args["tag"]),
+        max_workers=args["workers"],
+        client=iam_client,
+    )
+
+
+def _main_select(
+    args: Dict, dir_path: Optional[str], bucket: Optional[str], output_format: str
+) -> None:
+    """Applies the method and operations of the arguments to every selected role."""
+
+    operations = {
+        key: args[key]
+        for key in [
+            "method",
+            "arn",
+            "add_external_id",
+            "remove_external_id",
+            "add_sid",
+            "remove_sid",
+        ]
+    }
+    records = (
+        dict(operations, update_role=role["RoleName"]) for role in _selected_roles(args)
+    )
+
+    _main_batch(args, dir_path, bucket, output_format, records=records)
+
+
+def _main_rollback(args: Dict, output_format: str) -> None:
+    """Rolls back every role in the --journal, writing each result."""
+    from trustyroles.arpd_update.journal import UndoJournal
+
+    journal = UndoJournal.load(args["journal"])
+    results = journal.rollback(max_workers=args["workers"])
+    journal.close()
+
+    for result in results:
+        write_result(result, output_format)
+
+    if any(result["status"] != "ok" for result in results):
+        sys.exit(1)
+
+
+def _main_compact(
+    args: Dict, dir_path: Optional[str], bucket: Optional[str], output_format: str
+) -> None:
+    """Compacts the backups of a location, writing a summary per role."""
+    from trustyroles.arpd_update.retention import compact_backups
+
+    started = time.perf_counter()
+    summary = compact_backups(
+        location_type=args["backup_policy"],
+        dir_path=dir_path,
+        bucket=bucket,
+        keep_last=args["keep_last"],
+        max_age_days=args["max_age_days"],
+    )
+
+    for role_name, counts in summary.items():
+        write_result(
+            make_result(role_name, "compact", started, **counts), output_format
+        )
+
+
+def _main_bulk_restore(
+    args: Dict, dir_path: Optional[str], bucket: Optional[str], output_format: str
+) -> None:
+    """Restores roles to their policies at --restore_time, writing each result."""
+    from trustyroles.arpd_update.restore import bulk_restore
+
+    if args["update_role"]:
+        role_names = [args["update_role"]]
+    elif _selects_roles(args):
+        role_names = [role["RoleName"] for role in _selected_roles(args)]
+    else:
+        role_names = None
+
+    failed = False
+
+    for result in bulk_restore(
+        timestamp=args["restore_time"],
+        location_type=args["backup_policy"],
+        role_names=role_names,
+        dir_path=dir_path,
+        bucket=bucket,
+        max_workers=args["workers"],
+    ):
+        failed = failed or result["status"] != "ok"
+        write_result(result, output_format)
+
+    if failed:
+        sys.exit(1)
+
+
+def _snapshot_get_arpd(args: Dict, role_name: str) -> Optional[Dict]:
+    """
+    Reads the policy of role_name from the snapshot, or returns None if it is
+    not in the snapshot or the roles under its path were not refreshed within
+    --max_staleness seconds.
+    """
+    from trustyroles.arpd_update.snapshot import snapshot_age, snapshot_get_role
+
+    try:
+        role = snapshot_get_role(args["snapshot"], role_name)
+    except KeyError:
+        LOGGER.warning(
+            "Role %s is not in snapshot %s, using IAM", role_name, args["snapshot"]
         )
+        return None
+
+    age = snapshot_age(args["snapshot"], role["path"])
+
+    if age is None:
+        LOGGER.warning("Snapshot %s was never refreshed", args["snapshot"])
+        return None
+
+    if args["max_staleness"] is not None and age > args["max_staleness"]:
+        LOGGER.warning("Snapshot %s is %ds old, using IAM", args["snapshot"], age)
+        return None
+
+    return role["policy"]
+
+
+def _main_snapshot(args: Dict, output_format: str) -> None:
+    """Refreshes the snapshot or finds the roles in it trusting --arn."""
+    from trustyroles.arpd_update.snapshot import find_trusting_roles, refresh_snapshot
+
+    started = time.perf_counter()
+
+    if args["method"] == "refresh":
+        count = refresh_snapshot(args["snapshot"], args["path_prefix"] or "/")
+        write_result(
+            make_result(
+                None, "refresh", started, snapshot=args["snapshot"], roles=count
+            ),
+            output_format,
+        )
+    else:
+        roles = find_trusting_roles(args["snapshot"], args["arn"])
 
-        print(json.dumps(arpd["Statement"][0], indent=4))
+        for role_name, arpd in roles.items():
+            write_result(make_result(role_name, "find", started, arpd), output_format)
+
+
+def policy_hash(policy: Dict) -> str:
+    """
+    The policy_hash method returns a SHA-256 hex digest of a policy document
+    that does not depend on key order or whitespace.
+    """
+
+    return hashlib.sha256(
+        json.dumps(policy, sort_keys=True, separators=(",", ":")).encode()
+    ).hexdigest()
 
 
 def get_arpd(role_name: str, session=None, client=None) -> Dict:
@@ -301,9 +833,12 @@ def update_arn(
             arpd["Statement"][0]["Principal"]["AWS"] = old_principal_list
             arpd["Statement"][0]["Principal"]["AWS"].append(arn)
 
+    with phase("json"):
+        policy_document = json.dumps(arpd)
+
     try:
         iam_client.update_assume_role_policy(
-            RoleName=role_name, PolicyDocument=json.dumps(arpd)
+            RoleName=role_name, PolicyDocument=policy_document
         )
 
         return arpd
@@ -356,9 +891,12 @@ def remove_arn(
         if arn in old_principal_list:
             arpd["Statement"][0]["Principal"]["AWS"].remove(arn)
 
+    with phase("json"):
+        policy_document = json.dumps(arpd)
+
     try:
         iam_client.update_assume_role_policy(
-            RoleName=role_name, PolicyDocument=json.dumps(arpd)
+            RoleName=role_name, PolicyDocument=policy_document
         )
 
         return arpd
@@ -411,9 +949,12 @@ def add_external_id(
         "StringEquals": {"sts:ExternalId": external_id}
     }
 
+    with phase("json"):
+        policy_document = json.dumps(arpd)
+
     try:
         iam_client.update_assume_role_policy(
-            RoleName=role_name, PolicyDocument=json.dumps(arpd)
+            RoleName=role_name, PolicyDocument=policy_document
         )
 
         return arpd
@@ -462,9 +1003,12 @@ def remove_external_id(
 
     arpd["Statement"][0]["Condition"] = {}
 
+    with phase("json"):
+        policy_document = json.dumps(arpd)
+
     try:
         iam_client.update_assume_role_policy(
-            RoleName=role_name, PolicyDocument=json.dumps(arpd)
+            RoleName=role_name, PolicyDocument=policy_document
         )
 
         return arpd
@@ -514,9 +1058,12 @@ def add_sid(
 
     arpd["Statement"][0]["Sid"] = sid
 
+    with phase("json"):
+        policy_document = json.dumps(arpd)
+
     try:
         iam_client.update_assume_role_policy(
-            RoleName=role_name, PolicyDocument=json.dumps(arpd)
+            RoleName=role_name, PolicyDocument=policy_document
         )
 
         return arpd
@@ -566,9 +1113,12 @@ def remove_sid(
     if arpd["Statement"][0]["Sid"]:
         arpd["Statement"][0].pop("Sid")
 
+        with phase("json"):
+            policy_document = json.dumps(arpd)
+
         try:
             iam_client.update_assume_role_policy(
-                RoleName=role_name, PolicyDocument=json.dumps(arpd)
+                RoleName=role_name, PolicyDocument=policy_document
             )
         except ClientError as error:
             raise error
@@ -593,7 +1143,7 @@ def retain_policy(
 
     assert location_type
     if location_type.lower() == "local":
-        with open(
+        with phase("backup file"), open(
             dir_path
             + "/"
             + datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
@@ -610,12 +1160,15 @@ def retain_policy(
         else:
             s3_client = boto3.client("s3")
 
+        with phase("json"):
+            body = json.dumps(policy).encode()
+
         try:
             s3_client.put_object(
                 Bucket=bucket,
                 Key=datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
                 + f".{role_name}.bk",
-                Body=json.dumps(policy).encode(),
+                Body=body,
             )
         except ClientError as error:
             raise error
@@ -662,7 +1215,8 @@ def restore_from_backup(
 
     iam_client.update_assume_role_policy(RoleName=role_name, PolicyDocument=policy)
 
-    return json.loads(policy)
+    with phase("json"):
+        return json.loads(policy)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,356 @@
+"""
+batch applies many arpd_update operations read as JSONL records,
+streaming them through a bounded worker pool.
+"""
+import os
+import json
+import time
+import logging
+import functools
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, TextIO
+import boto3  # type: ignore
+
+from trustyroles.arpd_update import arpd_update
+from trustyroles.arpd_update.journal import UndoJournal
+from trustyroles.arpd_update.output import make_result
+
+LOGGER = logging.getLogger("IAM-ROLE-TRUST-POLICY")
+
+OPERATIONS = ["add_external_id", "remove_external_id", "add_sid", "remove_sid"]
+CHANGING_OPERATIONS = ["update", "remove"] + OPERATIONS
+
+
+def read_records(stream: TextIO) -> Iterator[Dict]:
+    """
+    The read_records method lazily reads JSONL records from a stream.
+    Each record takes the same keys as the CLI arguments, e.g.
+    {"update_role": "test-role", "method": "update", "arn": ["arn:..."]}.
+    Lines that are not JSON objects are yielded with an "invalid" key.
+    """
+
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+
+        if not line:
+            continue
+
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            yield {"line": line_number, "invalid": f"Invalid JSON: {error}"}
+            continue
+
+        if not isinstance(record, dict):
+            yield {"line": line_number, "invalid": "Record is not a JSON object"}
+            continue
+
+        record["line"] = line_number
+        yield record
+
+
+def record_operations(record: Dict) -> List[str]:
+    """
+    The record_operations method returns the operations of a record in the order
+    they are applied: its method, then add/remove_external_id and add/remove_sid.
+    """
+
+    operations = [record["method"]] if record.get("method") else []
+
+    return operations + [key for key in OPERATIONS if record.get(key)]
+
+
+def apply_operation(
+    record: Dict,
+    operation: str,
+    client=None,
+    dir_path: Optional[str] = None,
+    bucket: Optional[str] = None,
+    backup_policy: Optional[str] = "",
+) -> Dict:
+    """
+    The apply_operation method runs one operation of a record against its role
+    and returns the resulting assume role policy document.
+    """
+
+    role_name = record.get("update_role")
+    backup_policy = backup_policy or ""
+
+    if not role_name:
+        raise ValueError("Record has no update_role")
+
+    arn_list = record.get("arn") or []
+    if isinstance(arn_list, str):
+        arn_list = [arn_list]
+
+    if operation == "get":
+        return arpd_update.get_arpd(role_name, client=client)
+
+    if operation == "update":
+        return arpd_update.update_arn(
+            role_name=role_name,
+            arn_list=arn_list,
+            dir_path=dir_path,
+            client=client,
+            bucket=bucket,
+            backup_policy=backup_policy,
+        )
+
+    if operation == "remove":
+        return arpd_update.remove_arn(
+            role_name=role_name,
+            arn_list=arn_list,
+            dir_path=dir_path,
+            client=client,
+            bucket=bucket,
+            backup_policy=backup_policy,
+        )
+
+    if operation == "add_external_id":
+        return arpd_update.add_external_id(
+            role_name=role_name,
+            external_id=record["add_external_id"],
+            dir_path=dir_path,
+            client=client,
+            bucket=bucket,
+            backup_policy=backup_policy,
+        )
+
+    if operation == "remove_external_id":
+        return arpd_update.remove_external_id(
+            role_name=role_name,
+            dir_path=dir_path,
+            client=client,
+            bucket=bucket,
+            backup_policy=backup_policy,
+        )
+
+    if operation == "add_sid":
+        return arpd_update.add_sid(
+            role_name=role_name,
+            sid=record["add_sid"],
+            dir_path=dir_path,
+            client=client,
+            bucket=bucket,
+            backup_policy=backup_policy,
+        )
+
+    if operation == "remove_sid":
+        return arpd_update.remove_sid(
+            role_name=role_name,
+            dir_path=dir_path,
+            client=client,
+            bucket=bucket,
+            backup_policy=backup_policy,
+        )
+
+    raise ValueError(f"Unsupported method: {operation}")
+
+
+def apply_record(record: Dict, client=None, **kwargs) -> Dict:
+    """
+    The apply_record method runs the operations of a single record
+    against its role and returns the resulting assume role policy document.
+    """
+
+    operations = record_operations(record)
+
+    if not operations:
+        raise ValueError("Record has no operation")
+
+    for operation in operations:
+        arpd = apply_operation(record, operation, client=client, **kwargs)
+
+    return arpd
+
+
+def _run_record(
+    record: Dict, client, journals: Iterable[UndoJournal] = (), **kwargs
+) -> List[Dict]:
+    role_name = record.get("update_role")
+    results = []
+
+    # a result per operation, stopping at the first failed one
+    for operation in record_operations(record) or [None]:
+        started = time.perf_counter()
+
+        try:
+            if operation is None:
+                raise ValueError("Record has no operation")
+
+            if (
+                operation in CHANGING_OPERATIONS
+                and role_name
+                and any(role_name not in journal for journal in journals)
+            ):
+                pre_image = arpd_update.get_arpd(role_name, client=client)
+
+                for journal in journals:
+                    journal.record(role_name, pre_image)
+
+            policy = apply_operation(record, operation, client=client, **kwargs)
+        except Exception as error:  # pylint: disable=broad-except
+            LOGGER.error("Line %s failed: %s", record.get("line"), error)
+            results.append(
+                make_result(
+                    role_name,
+                    operation,
+                    started,
+                    error=str(error),
+                    line=record.get("line"),
+                )
+            )
+            break
+
+        results.append(
+            make_result(role_name, operation, started, policy, line=record.get("line"))
+        )
+
+    return results
+
+
+def _complete(
+    pending: Dict, queued: Dict[str, deque], submit: Callable, resubmit: bool
+) -> List[Dict]:
+    """
+    Waits for records to complete, submitting the next queued record of their
+    roles, or with resubmit False dropping it. Returns the results of the
+    completed records' operations.
+    """
+
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    results = []
+
+    for future in done:
+        role_name = pending.pop(future)
+
+        if resubmit and queued[role_name]:
+            pending[submit(queued[role_name].popleft())] = role_name
+        else:
+            del queued[role_name]
+
+        results.extend(future.result())
+
+    return results
+
+
+def run_batch(
+    records: Iterable[Dict],
+    max_workers: int = 8,
+    session=None,
+    client=None,
+    dir_path: Optional[str] = None,
+    bucket: Optional[str] = None,
+    backup_policy: Optional[str] = "",
+    journal: Optional[UndoJournal] = None,
+    rollback_on_error: bool = False,
+) -> Iterator[Dict]:
+    """
+    The run_batch method applies records with a pool of max_workers threads
+    and yields a result per operation of each record as it completes.
+    At most 2 * max_workers records are read ahead, so input of any size
+    is never held in memory.
+    Records of the same role are applied one at a time in input order, as
+    each operation reads, modifies and writes the role's policy.
+    With a journal, the pre-image of every changed role is recorded first.
+    With rollback_on_error, the first failed record stops the batch and every
+    role changed by this batch is rolled back, yielding a rollback result per
+    role. Roles journaled by earlier batches are left to an explicit rollback.
+    """
+
+    if session:
+        iam_client = session.client("iam")
+    elif client:
+        iam_client = client
+    else:
+        iam_client = boto3.client("iam")
+
+    journals = [journal] if journal is not None else []
+    run_journal = None
+    run_spill_path = None
+
+    if rollback_on_error:
+        # pre-images of this batch only, spilled like the journal
+        if journal is not None and journal.spill_path:
+            file, run_spill_path = tempfile.mkstemp(suffix=".jsonl")
+            os.close(file)
+
+        run_journal = UndoJournal(run_spill_path)
+        journals.append(run_journal)
+        journaled = set(journal.roles()) if journal is not None else set()
+
+    window = max_workers * 2
+    # running future -> role, and role -> records waiting for that future
+    pending = {}  # type: Dict
+    queued = {}  # type: Dict[str, deque]
+    failed = False
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        submit = functools.partial(
+            executor.submit,
+            _run_record,
+            client=iam_client,
+            journals=journals,
+            dir_path=dir_path,
+            bucket=bucket,
+            backup_policy=backup_policy,
+        )
+
+        for record in records:
+            role_name = record.get("update_role")
+
+            if "invalid" in record:
+                failed = True
+                yield make_result(
+                    None,
+                    None,
+                    time.perf_counter(),
+                    error=record["invalid"],
+                    line=record["line"],
+                )
+            elif role_name in queued:
+                queued[role_name].append(record)
+            else:
+                queued[role_name] = deque()
+                pending[submit(record)] = role_name
+
+            while len(pending) + sum(map(len, queued.values())) >= window:
+                for result in _complete(
+                    pending, queued, submit, not (failed and rollback_on_error)
+                ):
+                    failed = failed or result["status"] != "ok"
+                    yield result
+
+            if failed and rollback_on_error:
+                break
+
+        while pending:
+            for result in _complete(
+                pending, queued, submit, not (failed and rollback_on_error)
+            ):
+                failed = failed or result["status"] != "ok"
+                yield result
+
+    if not rollback_on_error:
+        return
+
+    try:
+        if failed:
+            LOGGER.warning("Batch failed, rolling back %s roles", len(run_journal))
+
+            for result in run_journal.rollback(
+                max_workers=max_workers, client=iam_client
+            ):
+                if journal is not None and result["status"] == "ok":
+                    if result["update_role"] not in journaled:
+                        journal.discard(result["update_role"])
+
+                yield result
+    finally:
+        run_journal.close()
+
+        if run_spill_path:
+            os.remove(run_spill_path)
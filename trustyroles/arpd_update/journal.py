@@ -0,0 +1,167 @@
+"""
+journal keeps the pre-image of every role changed by a batch,
+so the batch can be rolled back on failure or on request.
+"""
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from typing import Dict, List, Optional
+import boto3  # type: ignore
+
+from trustyroles.arpd_update.arpd_update import policy_hash
+from trustyroles.arpd_update.output import make_result
+
+LOGGER = logging.getLogger("IAM-ROLE-TRUST-POLICY")
+
+
+class UndoJournal:
+    """
+    The UndoJournal holds the first recorded policy of each role.
+    With a spill_path, policies are appended to that JSONL file instead of
+    held in memory, and the journal can be reopened with UndoJournal.load.
+    """
+
+    def __init__(self, spill_path: Optional[str] = None):
+        self._lock = threading.Lock()
+        self._entries = {}  # type: Dict[str, object]
+        self.spill_path = spill_path
+        self._spill_file = open(spill_path, "ab+") if spill_path else None
+
+    @classmethod
+    def load(cls, spill_path: str) -> "UndoJournal":
+        """The load method reopens a journal from its spill_path."""
+
+        journal = cls(spill_path)
+
+        with open(spill_path, "rb") as file:
+            offset = file.tell()
+
+            for line in iter(file.readline, b""):
+                entry = json.loads(line)
+
+                if entry.get("reverted"):
+                    journal._entries.pop(entry["update_role"], None)
+                else:
+                    journal._entries.setdefault(entry["update_role"], offset)
+
+                offset = file.tell()
+
+        return journal
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, role_name: str) -> bool:
+        return role_name in self._entries
+
+    def roles(self) -> List[str]:
+        """The roles method returns the journaled role names."""
+
+        return sorted(self._entries)
+
+    def record(self, role_name: str, policy: Dict) -> None:
+        """
+        The record method stores policy as the pre-image of role_name.
+        Only the first record of a role is kept.
+        """
+
+        with self._lock:
+            if role_name in self._entries:
+                return
+
+            if self._spill_file:
+                self._entries[role_name] = self._append(
+                    {"update_role": role_name, "policy": policy}
+                )
+            else:
+                self._entries[role_name] = policy
+
+    def pre_image(self, role_name: str) -> Dict:
+        """The pre_image method returns the recorded policy of role_name."""
+
+        with self._lock:
+            entry = self._entries[role_name]
+
+            if not self._spill_file:
+                return entry  # type: ignore
+
+            self._spill_file.seek(entry)  # type: ignore
+            return json.loads(self._spill_file.readline())["policy"]
+
+    def discard(self, role_name: str) -> None:
+        """The discard method removes role_name from the journal."""
+
+        with self._lock:
+            if self._entries.pop(role_name, None) is not None and self._spill_file:
+                self._append({"update_role": role_name, "reverted": True})
+
+    def rollback(self, max_workers: int = 8, session=None, client=None) -> List[Dict]:
+        """
+        The rollback method restores the pre-image of every journaled role with
+        max_workers threads, verifying each by hash. Reverted roles are removed
+        from the journal. Returns a result per role, its "result" being
+        reverted, or unchanged if the live policy already matched.
+        """
+
+        if session:
+            iam_client = session.client("iam")
+        elif client:
+            iam_client = client
+        else:
+            iam_client = boto3.client("iam")
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(self._rollback_role, role_name, iam_client)
+                for role_name in self.roles()
+            ]
+            results = [future.result() for future in as_completed(futures)]
+
+        return results
+
+    def close(self) -> None:
+        """The close method closes the spill file."""
+
+        if self._spill_file:
+            self._spill_file.close()
+
+    def _append(self, entry: Dict) -> int:
+        self._spill_file.seek(0, 2)  # type: ignore
+        offset = self._spill_file.tell()  # type: ignore
+        self._spill_file.write(json.dumps(entry).encode() + b"\n")  # type: ignore
+        self._spill_file.flush()  # type: ignore
+
+        return offset
+
+    def _rollback_role(self, role_name: str, iam_client) -> Dict:
+        started = time.perf_counter()
+
+        try:
+            policy = self.pre_image(role_name)
+            expected_hash = policy_hash(policy)
+            live_policy = iam_client.get_role(RoleName=role_name)["Role"][
+                "AssumeRolePolicyDocument"
+            ]
+            result = "unchanged"
+
+            if policy_hash(live_policy) != expected_hash:
+                iam_client.update_assume_role_policy(
+                    RoleName=role_name, PolicyDocument=json.dumps(policy)
+                )
+                live_policy = iam_client.get_role(RoleName=role_name)["Role"][
+                    "AssumeRolePolicyDocument"
+                ]
+                result = "reverted"
+
+            if policy_hash(live_policy) != expected_hash:
+                raise ValueError("Policy hash mismatch after rollback")
+        except Exception as error:  # pylint: disable=broad-except
+            LOGGER.error("Rolling back %s failed: %s", role_name, error)
+            return make_result(role_name, "rollback", started, error=str(error))
+
+        self.discard(role_name)
+
+        return make_result(role_name, "rollback", started, policy, result=result)
@@ -0,0 +1,112 @@
+"""
+output formats arpd_update results for the CLI, either as the
+human readable text output or as compact NDJSON records.
+"""
+import sys
+import json
+import time
+from datetime import datetime
+
+from typing import Dict, Optional, TextIO
+
+from trustyroles.arpd_update.profiling import phase
+
+OUTPUT_FORMATS = ["text", "ndjson"]
+# result fields added to the header line of the text format when present
+TEXT_HEADER_FIELDS = ["line", "result", "backup"]
+
+
+def make_result(
+    role_name: Optional[str],
+    method: Optional[str],
+    started: float,
+    policy: Optional[Dict] = None,
+    error: Optional[str] = None,
+    **extra,
+) -> Dict:
+    """
+    The make_result method builds a result record for one role and operation.
+    started is the time.perf_counter() value taken before the operation ran.
+    """
+
+    result = dict(extra)
+    result.update(
+        {
+            "update_role": role_name,
+            "method": method,
+            "status": "error" if error else "ok",
+            "finished": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+    )
+
+    if error:
+        result["error"] = error
+    else:
+        result["policy"] = policy
+
+    return result
+
+
+def write_result(
+    result: Dict,
+    output_format: str = "text",
+    stream: Optional[TextIO] = None,
+    arns_only: bool = False,
+) -> None:
+    """
+    The write_result method writes a result record to stream (stdout by default)
+    and flushes it, so results can be consumed in a pipe as they arrive.
+    ndjson writes the full record on one line, text writes a role, method and
+    status header line, then the first statement or, with arns_only, the
+    trusted ARNs and conditions. Records without a policy are written in full
+    in both formats.
+    """
+
+    if stream is None:
+        stream = sys.stdout
+
+    with phase("output"):
+        _write_result(result, output_format, stream, arns_only)
+
+
+def _write_result(
+    result: Dict, output_format: str, stream: TextIO, arns_only: bool
+) -> None:
+    if output_format == "ndjson":
+        stream.write(json.dumps(result, separators=(",", ":")) + "\n")
+    elif result["status"] != "ok":
+        stream.write(f"{_text_header(result)}: {result['error']}\n")
+    elif result.get("policy") is None:
+        stream.write(json.dumps(result, indent=4) + "\n")
+    elif arns_only:
+        statement = result["policy"]["Statement"][0]
+        stream.write(_text_header(result) + "\n")
+        stream.write("\nARNS:\n")
+
+        if isinstance(statement["Principal"]["AWS"], list):
+            for arn in statement["Principal"]["AWS"]:
+                stream.write(f"  {arn}\n")
+        else:
+            stream.write(f"  {statement['Principal']['AWS']}\n")
+
+        stream.write("Conditions:\n")
+
+        if statement.get("Condition"):
+            stream.write(f"  {statement['Condition']}\n")
+    else:
+        stream.write(_text_header(result) + "\n")
+        stream.write(json.dumps(result["policy"]["Statement"][0], indent=4) + "\n")
+
+    stream.flush()
+
+
+def _text_header(result: Dict) -> str:
+    fields = [str(result["update_role"]), str(result["method"]), result["status"]]
+    fields.extend(
+        f"{key}={result[key]}"
+        for key in TEXT_HEADER_FIELDS
+        if result.get(key) is not None
+    )
+
+    return " ".join(fields)
@@ -0,0 +1,185 @@
+"""
+profiling records wall and CPU time per phase of arpd_update, AWS calls
+included, with an optional cProfile dump, and reports the hot paths.
+"""
+import io
+import time
+import pstats
+import cProfile
+import threading
+from contextlib import contextmanager
+
+from typing import Dict, Iterator, List, Optional
+import boto3  # type: ignore
+
+_ACTIVE = None  # type: Optional[Profiler]
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """
+    The phase method times the enclosed block as phase name of the
+    active profiler. It does nothing when no profiler is active.
+    """
+
+    profiler = _ACTIVE
+
+    if profiler is None:
+        yield
+        return
+
+    wall, cpu = time.perf_counter(), time.process_time()
+
+    try:
+        yield
+    finally:
+        profiler.add(name, time.perf_counter() - wall, time.process_time() - cpu)
+
+
+class Profiler:
+    """
+    The Profiler context manager records phases timed with phase, and every
+    call of clients created from the default boto3 session (or passed to
+    instrument) as "aws <service>.<Operation>". With cprofile or a dump_path,
+    the profiled thread also runs under cProfile, dumped to dump_path.
+    CPU times are for the whole process, so overlap in threaded code.
+    """
+
+    def __init__(self, dump_path: Optional[str] = None, cprofile: bool = False):
+        self.dump_path = dump_path
+        self.phases = {}  # type: Dict[str, List[float]]
+        self._lock = threading.Lock()
+        self._cprofile = cProfile.Profile() if cprofile or dump_path else None
+        self._instrumented = []  # type: List
+        self._started = (0.0, 0.0)
+        self._elapsed = (0.0, 0.0)
+        self._cpu_before = 0.0
+
+    def __enter__(self) -> "Profiler":
+        global _ACTIVE  # pylint: disable=global-statement
+
+        if boto3.DEFAULT_SESSION is None:
+            boto3.setup_default_session()
+
+        self.instrument(boto3.DEFAULT_SESSION)
+        _ACTIVE = self
+        self._started = (time.perf_counter(), time.process_time())
+        # interpreter startup and imports, boto3 included, for the CLI
+        self._cpu_before = self._started[1]
+
+        if self._cprofile:
+            self._cprofile.enable()
+
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        global _ACTIVE  # pylint: disable=global-statement
+
+        if self._cprofile:
+            self._cprofile.disable()
+
+        self._elapsed = (
+            time.perf_counter() - self._started[0],
+            time.process_time() - self._started[1],
+        )
+        _ACTIVE = None
+
+        for events in self._instrumented:
+            events.unregister("before-call", self._before_call)
+            events.unregister("after-call", self._after_call)
+
+        if self.dump_path:
+            self._cprofile.dump_stats(self.dump_path)  # type: ignore
+
+    def instrument(self, session_or_client) -> None:
+        """
+        The instrument method times the AWS calls of a boto3 session or client.
+        Clients take the hooks of their session when they are created.
+        """
+
+        if hasattr(session_or_client, "meta"):
+            events = session_or_client.meta.events
+        else:
+            events = session_or_client.events
+
+        events.register("before-call", self._before_call)
+        events.register("after-call", self._after_call)
+        self._instrumented.append(events)
+
+    def add(self, name: str, wall: float, cpu: float = 0.0) -> None:
+        """The add method adds a call of wall and cpu seconds to phase name."""
+
+        with self._lock:
+            totals = self.phases.setdefault(name, [0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += wall
+            totals[2] += cpu
+
+    def report(self, limit: int = 10) -> str:
+        """
+        The report method returns the phases by wall time and, with cProfile,
+        the limit functions with the most time spent in themselves.
+        """
+
+        lines = [
+            f"{'phase':<40} {'calls':>6} {'wall ms':>10} {'cpu ms':>10}",
+            f"{'before profiling (startup, imports)':<40} {'':>6} {'-':>10} "
+            f"{self._cpu_before * 1000:>10.1f}",
+        ]
+
+        for name, (calls, wall, cpu) in sorted(
+            self.phases.items(), key=lambda item: item[1][1], reverse=True
+        ):
+            lines.append(
+                f"{name:<40} {calls:>6} {wall * 1000:>10.1f} {cpu * 1000:>10.1f}"
+            )
+
+        lines.append(
+            f"{'total':<40} {'':>6} {self._elapsed[0] * 1000:>10.1f} "
+            f"{self._elapsed[1] * 1000:>10.1f}"
+        )
+
+        if self._cprofile:
+            stats = pstats.Stats(self._cprofile, stream=io.StringIO())
+            hot_paths = sorted(
+                stats.stats.items(),  # type: ignore
+                key=lambda item: item[1][2],
+                reverse=True,
+            )
+            lines.append("")
+            lines.append(
+                f"{'function':<60} {'calls':>8} {'self ms':>10} {'cum ms':>10}"
+            )
+
+            for (file_name, line, function), values in hot_paths[:limit]:
+                _, calls, self_time, cum_time, _ = values
+                where = f"{function} ({file_name.split('/')[-1]}:{line})"
+                lines.append(
+                    f"{where[:60]:<60} {calls:>8} {self_time * 1000:>10.1f} "
+                    f"{cum_time * 1000:>10.1f}"
+                )
+
+        return "\n".join(lines)
+
+    def _before_call(self, context: Dict, **kwargs) -> None:
+        context["profiling_started"] = (time.perf_counter(), time.process_time())
+
+    def _after_call(self, context: Dict, model, **kwargs) -> None:
+        if "profiling_started" not in context:
+            return
+
+        wall, cpu = context.pop("profiling_started")
+        self.add(
+            f"aws {model.service_model.endpoint_prefix}.{model.name}",
+            time.perf_counter() - wall,
+            time.process_time() - cpu,
+        )
+
+
+def profile(dump_path: Optional[str] = None, cprofile: bool = False) -> Profiler:
+    """
+    The profile method returns a Profiler to use as a context manager:
+    with profile() as profiler: ...; print(profiler.report())
+    """
+
+    return Profiler(dump_path=dump_path, cprofile=cprofile)
@@ -0,0 +1,150 @@
+"""
+restore rolls many roles back to the policies they had at a point in time,
+using the backups made by retain_policy and compacted by retention.
+"""
+import json
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from typing import Dict, Iterable, Iterator, Optional
+import boto3  # type: ignore
+
+from trustyroles.arpd_update.arpd_update import policy_hash
+from trustyroles.arpd_update.output import make_result
+from trustyroles.arpd_update.retention import list_backups, load_version_since
+
+LOGGER = logging.getLogger("IAM-ROLE-TRUST-POLICY")
+
+
+def _restore_role(role_name: str, *args) -> Dict:
+    started = time.perf_counter()
+
+    try:
+        return _restore(role_name, started, *args)
+    except Exception as error:  # pylint: disable=broad-except
+        LOGGER.error("Restoring %s failed: %s", role_name, error)
+        return make_result(role_name, "restore", started, error=str(error))
+
+
+def _restore(
+    role_name: str,
+    started: float,
+    entry: Optional[Dict],
+    timestamp: str,
+    iam_client,
+    s3_client,
+    location_type: str,
+    dir_path: Optional[str],
+    bucket: Optional[str],
+) -> Dict:
+    if not entry:
+        return make_result(role_name, "restore", started, error="No backups found")
+
+    version = load_version_since(
+        entry, timestamp, location_type, dir_path, bucket, client=s3_client
+    )
+
+    if not version:
+        return make_result(role_name, "restore", started, result="unchanged")
+
+    backup_timestamp, policy = version
+    expected_hash = policy_hash(policy)
+    live_policy = iam_client.get_role(RoleName=role_name)["Role"][
+        "AssumeRolePolicyDocument"
+    ]
+
+    if policy_hash(live_policy) == expected_hash:
+        return make_result(
+            role_name,
+            "restore",
+            started,
+            policy,
+            result="skipped",
+            backup=backup_timestamp,
+            policy_hash=expected_hash,
+        )
+
+    iam_client.update_assume_role_policy(
+        RoleName=role_name, PolicyDocument=json.dumps(policy)
+    )
+    live_policy = iam_client.get_role(RoleName=role_name)["Role"][
+        "AssumeRolePolicyDocument"
+    ]
+
+    if policy_hash(live_policy) != expected_hash:
+        return make_result(
+            role_name,
+            "restore",
+            started,
+            error="Policy hash mismatch after restore",
+            backup=backup_timestamp,
+            policy_hash=expected_hash,
+        )
+
+    return make_result(
+        role_name,
+        "restore",
+        started,
+        policy,
+        result="restored",
+        backup=backup_timestamp,
+        policy_hash=expected_hash,
+    )
+
+
+def bulk_restore(
+    timestamp: str,
+    location_type: str,
+    role_names: Optional[Iterable[str]] = None,
+    dir_path: Optional[str] = None,
+    bucket: Optional[str] = None,
+    max_workers: int = 8,
+    session=None,
+    client=None,
+    s3_client=None,
+) -> Iterator[Dict]:
+    """
+    The bulk_restore method restores role_names, or every role with backups,
+    to the policy they had at timestamp (<ISO-time> as used in backup names).
+    Backups are fetched and applied by max_workers threads. Roles already
+    matching their backup are skipped and every applied policy is verified
+    by hash. Yields a result per role as it completes, its "result" being
+    restored, skipped or unchanged (no backup since timestamp). Roles whose
+    backups covering timestamp were removed by retention yield an error.
+    """
+
+    if session:
+        iam_client = session.client("iam")
+        s3_client = s3_client or session.client("s3")
+    elif client:
+        iam_client = client
+    else:
+        iam_client = boto3.client("iam")
+
+    if location_type.lower() == "s3" and not s3_client:
+        s3_client = boto3.client("s3")
+
+    entries = list_backups(location_type, dir_path, bucket, client=s3_client)
+
+    if role_names is None:
+        role_names = sorted(entries)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(
+                _restore_role,
+                role_name,
+                entries.get(role_name),
+                timestamp,
+                iam_client,
+                s3_client,
+                location_type,
+                dir_path,
+                bucket,
+            )
+            for role_name in role_names
+        ]
+
+        for future in as_completed(futures):
+            yield future.result()
@@ -0,0 +1,447 @@
+"""
+retention prunes and compacts the backups made by retain_policy.
+Each role's <ISO-time>.<RoleName>.bk files are rewritten as a single
+<RoleName>.bkh history holding a base policy and a delta per change.
+"""
+import os
+import re
+import json
+import logging
+from datetime import datetime, timedelta
+
+from typing import Dict, List, Optional, Tuple
+import boto3  # type: ignore
+
+LOGGER = logging.getLogger("IAM-ROLE-TRUST-POLICY")
+
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+BACKUP_PATTERN = re.compile(r"^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}Z)\.(.+)\.bk$")
+HISTORY_SUFFIX = ".bkh"
+
+Version = Tuple[str, Dict]
+
+
+def parse_backup_name(name: str) -> Optional[Tuple[str, str]]:
+    """
+    The parse_backup_name method returns (timestamp, role_name) for a
+    backup file or key name, or None if it is not a backup.
+    """
+
+    match = BACKUP_PATTERN.match(os.path.basename(name))
+
+    if not match:
+        return None
+
+    return match.group(1), match.group(2)
+
+
+def policy_delta(old: Dict, new: Dict) -> List[Dict]:
+    """
+    The policy_delta method returns the operations turning policy old into new.
+    Statements only differing by trusted ARNs are stored as ARN additions and
+    removals, other changed statements in full.
+    """
+
+    old_rest = {key: value for key, value in old.items() if key != "Statement"}
+    new_rest = {key: value for key, value in new.items() if key != "Statement"}
+
+    if old_rest != new_rest or len(old["Statement"]) != len(new["Statement"]):
+        return [{"op": "replace", "value": new}]
+
+    ops = []
+
+    for index, (old_statement, new_statement) in enumerate(
+        zip(old["Statement"], new["Statement"])
+    ):
+        if old_statement == new_statement:
+            continue
+
+        arns_op = _arns_delta(index, old_statement, new_statement)
+
+        if arns_op:
+            ops.append(arns_op)
+        else:
+            ops.append({"op": "statement", "index": index, "value": new_statement})
+
+    return ops
+
+
+def _principal_arns(statement: Dict):
+    principal = statement.get("Principal", {})
+
+    return principal.get("AWS") if isinstance(principal, dict) else None
+
+
+def _arns_delta(index: int, old: Dict, new: Dict) -> Optional[Dict]:
+    old_arns = _principal_arns(old)
+    new_arns = _principal_arns(new)
+
+    if not isinstance(old_arns, list) or not isinstance(new_arns, list):
+        return None
+
+    if _without_arns(old) != _without_arns(new):
+        return None
+
+    op = {
+        "op": "arns",
+        "index": index,
+        "add": [arn for arn in new_arns if arn not in old_arns],
+        "remove": [arn for arn in old_arns if arn not in new_arns],
+    }
+
+    # only usable if applying it reproduces the exact ARN order
+    if _apply_arns(old_arns, op) != new_arns:
+        return None
+
+    return op
+
+
+def _without_arns(statement: Dict) -> Dict:
+    statement = dict(statement)
+    statement["Principal"] = dict(statement["Principal"])
+    statement["Principal"].pop("AWS")
+
+    return statement
+
+
+def _apply_arns(arns: List, op: Dict) -> List:
+    return [arn for arn in arns if arn not in op["remove"]] + op["add"]
+
+
+def apply_delta(policy: Dict, ops: List[Dict]) -> Dict:
+    """The apply_delta method returns a copy of policy with the delta ops applied."""
+
+    policy = json.loads(json.dumps(policy))
+
+    for op in ops:
+        if op["op"] == "replace":
+            policy = json.loads(json.dumps(op["value"]))
+        elif op["op"] == "statement":
+            policy["Statement"][op["index"]] = op["value"]
+        elif op["op"] == "arns":
+            principal = policy["Statement"][op["index"]]["Principal"]
+            principal["AWS"] = _apply_arns(principal["AWS"], op)
+        else:
+            raise ValueError(f"Unsupported delta op: {op['op']}")
+
+    return policy
+
+
+def encode_history(
+    role_name: str, versions: List[Version], dropped_until: Optional[str] = None
+) -> Dict:
+    """
+    The encode_history method encodes timestamp ordered versions as a base
+    version and deltas. A run of identical versions is stored once with the
+    timestamp of its last version, which keeps load_version_since answers.
+    dropped_until is the timestamp of the newest version removed by retention.
+    """
+
+    history = {
+        "role_name": role_name,
+        "dropped_until": dropped_until,
+        "base": None,
+        "deltas": [],
+    }
+    previous = None
+
+    for timestamp, policy in versions:
+        if previous is None:
+            history["base"] = {"timestamp": timestamp, "policy": policy}
+        else:
+            ops = policy_delta(previous, policy)
+
+            if not ops:
+                # the policy was live until the later backup of the run
+                (history["deltas"] or [history["base"]])[-1]["timestamp"] = timestamp
+                continue
+
+            history["deltas"].append({"timestamp": timestamp, "ops": ops})
+
+        previous = policy
+
+    return history
+
+
+def decode_history(history: Dict) -> List[Version]:
+    """The decode_history method expands a history into timestamp ordered versions."""
+
+    if not history.get("base"):
+        return []
+
+    policy = history["base"]["policy"]
+    versions = [(history["base"]["timestamp"], policy)]
+
+    for delta in history["deltas"]:
+        policy = apply_delta(policy, delta["ops"])
+        versions.append((delta["timestamp"], policy))
+
+    return versions
+
+
+def apply_retention(
+    versions: List[Version],
+    keep_last: Optional[int] = None,
+    max_age_days: Optional[int] = None,
+    now: Optional[datetime] = None,
+) -> List[Version]:
+    """
+    The apply_retention method keeps the keep_last newest versions
+    that are at most max_age_days old. The newest version is always kept.
+    """
+
+    versions = sorted(versions, key=lambda version: version[0])
+
+    if not versions:
+        return versions
+
+    newest = versions[-1]
+
+    if keep_last is not None:
+        versions = versions[-keep_last:] if keep_last > 0 else []
+
+    if max_age_days is not None:
+        cutoff = ((now or datetime.utcnow()) - timedelta(days=max_age_days)).strftime(
+            TIME_FORMAT
+        )
+        versions = [version for version in versions if version[0] >= cutoff]
+
+    if not versions or versions[-1] is not newest:
+        versions.append(newest)
+
+    return versions
+
+
+def list_backups(
+    location_type: str,
+    dir_path: Optional[str] = None,
+    bucket: Optional[str] = None,
+    session=None,
+    client=None,
+) -> Dict[str, Dict]:
+    """
+    The list_backups method groups the backups of a directory or bucket by role,
+    returning {role_name: {"backups": [(timestamp, name)], "history": name or None}}.
+    """
+
+    if location_type.lower() == "local":
+        names = os.listdir(dir_path or os.getcwd())
+    elif location_type.lower() == "s3":
+        s3_client = _s3_client(session, client)
+        paginator = s3_client.get_paginator("list_objects_v2")
+        names = [
+            item["Key"]
+            for page in paginator.paginate(Bucket=bucket)
+            for item in page.get("Contents", [])
+        ]
+    else:
+        raise ValueError(f"Unsupported location_type: {location_type}")
+
+    roles = {}  # type: Dict[str, Dict]
+
+    for name in names:
+        parsed = parse_backup_name(name)
+
+        if parsed:
+            entry = roles.setdefault(parsed[1], {"backups": [], "history": None})
+            entry["backups"].append((parsed[0], name))
+        elif name.endswith(HISTORY_SUFFIX):
+            role_name = name[: -len(HISTORY_SUFFIX)]
+            entry = roles.setdefault(role_name, {"backups": [], "history": None})
+            entry["history"] = name
+
+    for entry in roles.values():
+        entry["backups"].sort()
+
+    return roles
+
+
+def _load_versions(
+    entry: Dict, location_type, dir_path, bucket, session, client
+) -> Tuple[List[Version], Optional[str]]:
+    versions = {}
+    dropped_until = None
+
+    if entry["history"]:
+        history = json.loads(
+            _read(entry["history"], location_type, dir_path, bucket, session, client)
+        )
+        versions.update(decode_history(history))
+        dropped_until = history.get("dropped_until")
+
+    for timestamp, name in entry["backups"]:
+        versions[timestamp] = json.loads(
+            _read(name, location_type, dir_path, bucket, session, client)
+        )
+
+    return sorted(versions.items(), key=lambda version: version[0]), dropped_until
+
+
+def load_versions(
+    entry: Dict,
+    location_type: str,
+    dir_path: Optional[str] = None,
+    bucket: Optional[str] = None,
+    session=None,
+    client=None,
+) -> List[Version]:
+    """
+    The load_versions method reads every version of a list_backups entry,
+    from its history and its uncompacted backups, in timestamp order.
+    """
+
+    return _load_versions(entry, location_type, dir_path, bucket, session, client)[0]
+
+
+def load_version_since(
+    entry: Dict,
+    timestamp: str,
+    location_type: str,
+    dir_path: Optional[str] = None,
+    bucket: Optional[str] = None,
+    session=None,
+    client=None,
+) -> Optional[Version]:
+    """
+    The load_version_since method returns the first version of a list_backups
+    entry backed up at or after timestamp, reading only the objects needed.
+    As backups are taken before an edit, this is the policy live at timestamp.
+    Returns None if the role has no backup since timestamp. Raises ValueError
+    if the versions covering timestamp were removed by retention.
+    """
+
+    candidates = []
+
+    if entry["history"]:
+        history = json.loads(
+            _read(entry["history"], location_type, dir_path, bucket, session, client)
+        )
+
+        if history.get("dropped_until") and timestamp <= history["dropped_until"]:
+            raise ValueError(
+                f"Backups up to {history['dropped_until']} were removed by retention"
+            )
+
+        candidates.extend(
+            version for version in decode_history(history) if version[0] >= timestamp
+        )
+
+    for backup_timestamp, name in entry["backups"]:
+        if backup_timestamp >= timestamp:
+            if not candidates or backup_timestamp < candidates[0][0]:
+                policy = json.loads(
+                    _read(name, location_type, dir_path, bucket, session, client)
+                )
+                candidates.append((backup_timestamp, policy))
+            break
+
+    if not candidates:
+        return None
+
+    return min(candidates, key=lambda version: version[0])
+
+
+def compact_backups(
+    location_type: str,
+    dir_path: Optional[str] = None,
+    bucket: Optional[str] = None,
+    keep_last: Optional[int] = None,
+    max_age_days: Optional[int] = None,
+    session=None,
+    client=None,
+) -> Dict[str, Dict]:
+    """
+    The compact_backups method applies the retention policy to every role's backups
+    in a directory or bucket and rewrites them as one <RoleName>.bkh history.
+    The history records the newest version dropped, so restores to a time up to
+    it fail rather than apply a later version.
+    Returns per role the number of versions kept, deltas stored and files removed.
+    """
+
+    summary = {}
+
+    for role_name, entry in list_backups(
+        location_type, dir_path, bucket, session, client
+    ).items():
+        versions, dropped_until = _load_versions(
+            entry, location_type, dir_path, bucket, session, client
+        )
+        kept = apply_retention(versions, keep_last, max_age_days)
+        # restores to a time up to a dropped version can no longer be answered
+        kept_timestamps = {version[0] for version in kept}
+        dropped = [
+            version[0] for version in versions if version[0] not in kept_timestamps
+        ]
+        dropped_until = max(dropped + [dropped_until or ""]) or None
+        history = encode_history(role_name, kept, dropped_until)
+
+        _write(
+            role_name + HISTORY_SUFFIX,
+            json.dumps(history, separators=(",", ":")),
+            location_type,
+            dir_path,
+            bucket,
+            session,
+            client,
+        )
+
+        names = [name for _, name in entry["backups"]]
+        _delete(names, location_type, dir_path, bucket, session, client)
+
+        summary[role_name] = {
+            "versions": len(history["deltas"]) + 1,
+            "deltas": len(history["deltas"]),
+            "removed": len(names),
+        }
+        LOGGER.info("Compacted %s: %s", role_name, summary[role_name])
+
+    return summary
+
+
+def _s3_client(session, client):
+    if session:
+        return session.client("s3")
+    if client:
+        return client
+
+    return boto3.client("s3")
+
+
+def _read(name, location_type, dir_path, bucket, session, client) -> str:
+    if location_type.lower() == "local":
+        with open(os.path.join(dir_path or os.getcwd(), name), "r") as file:
+            return file.read()
+
+    response = _s3_client(session, client).get_object(Bucket=bucket, Key=name)
+
+    return response["Body"].read().decode()
+
+
+def _write(name, body, location_type, dir_path, bucket, session, client) -> None:
+    if location_type.lower() == "local":
+        path = os.path.join(dir_path or os.getcwd(), name)
+
+        with open(path + ".tmp", "w") as file:
+            file.write(body)
+
+        os.replace(path + ".tmp", path)
+    else:
+        _s3_client(session, client).put_object(
+            Bucket=bucket, Key=name, Body=body.encode()
+        )
+
+
+def _delete(names, location_type, dir_path, bucket, session, client) -> None:
+    if location_type.lower() == "local":
+        for name in names:
+            os.remove(os.path.join(dir_path or os.getcwd(), name))
+    else:
+        s3_client = _s3_client(session, client)
+
+        for start in range(0, len(names), 1000):
+            s3_client.delete_objects(
+                Bucket=bucket,
+                Delete={
+                    "Objects": [{"Key": name} for name in names[start : start + 1000]]
+                },
+            )
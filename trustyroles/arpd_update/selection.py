@@ -0,0 +1,122 @@
+"""
+selection streams the roles of an account matching a path prefix,
+role name patterns and tags, so operations only touch those roles.
+"""
+import re
+import fnmatch
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from typing import Dict, Iterable, Iterator, List, Optional
+import boto3  # type: ignore
+
+
+def list_roles(path_prefix: str = "/", session=None, client=None) -> Iterator[Dict]:
+    """
+    The list_roles method lazily lists the roles under path_prefix,
+    filtered by IAM rather than client side.
+    """
+
+    if session:
+        iam_client = session.client("iam")
+    elif client:
+        iam_client = client
+    else:
+        iam_client = boto3.client("iam")
+
+    paginator = iam_client.get_paginator("list_roles")
+
+    for page in paginator.paginate(PathPrefix=path_prefix):
+        for role in page["Roles"]:
+            yield role
+
+
+def parse_tags(tags: Optional[List[str]]) -> Dict[str, Optional[str]]:
+    """
+    The parse_tags method turns ["team=payments", "owner"] into
+    {"team": "payments", "owner": None}, None matching any value.
+    """
+
+    parsed = {}  # type: Dict[str, Optional[str]]
+
+    for tag in tags or []:
+        key, _, value = tag.partition("=")
+        parsed[key] = value if "=" in tag else None
+
+    return parsed
+
+
+def _role_tags(role: Dict, iam_client) -> Dict[str, str]:
+    if "Tags" in role:
+        tags = role["Tags"]
+    else:
+        paginator = iam_client.get_paginator("list_role_tags")
+        tags = [
+            tag
+            for page in paginator.paginate(RoleName=role["RoleName"])
+            for tag in page["Tags"]
+        ]
+
+    return {tag["Key"]: tag["Value"] for tag in tags}
+
+
+def _matches_tags(tags: Dict[str, str], wanted: Dict[str, Optional[str]]) -> bool:
+    return all(
+        key in tags and (value is None or tags[key] == value)
+        for key, value in wanted.items()
+    )
+
+
+def select_roles(
+    roles: Iterable[Dict],
+    name_glob: Optional[str] = None,
+    name_regex: Optional[str] = None,
+    tags: Optional[Dict[str, Optional[str]]] = None,
+    max_workers: int = 8,
+    session=None,
+    client=None,
+) -> Iterator[Dict]:
+    """
+    The select_roles method lazily yields the roles whose name matches
+    name_glob and name_regex and which have all tags, in input order.
+    Name filters run first, tags are then fetched by max_workers threads
+    for at most 2 * max_workers roles ahead.
+    """
+
+    glob_pattern = re.compile(fnmatch.translate(name_glob)) if name_glob else None
+    regex_pattern = re.compile(name_regex) if name_regex else None
+
+    named = (
+        role
+        for role in roles
+        if (not glob_pattern or glob_pattern.match(role["RoleName"]))
+        and (not regex_pattern or regex_pattern.search(role["RoleName"]))
+    )
+
+    if not tags:
+        for role in named:
+            yield role
+        return
+
+    if session:
+        iam_client = session.client("iam")
+    elif client:
+        iam_client = client
+    else:
+        iam_client = boto3.client("iam")
+
+    pending = deque()  # type: deque
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for role in named:
+            pending.append((role, executor.submit(_role_tags, role, iam_client)))
+
+            if len(pending) >= max_workers * 2:
+                role, future = pending.popleft()
+                if _matches_tags(future.result(), tags):
+                    yield role
+
+        while pending:
+            role, future = pending.popleft()
+            if _matches_tags(future.result(), tags):
+                yield role
@@ -0,0 +1,201 @@
+"""
+snapshot keeps the assume role policy documents of an account in a local
+SQLite file, so queries are answered without calling IAM.
+"""
+import json
+import sqlite3
+import logging
+from datetime import datetime
+
+from typing import Dict, Iterable, List, Optional
+import boto3  # type: ignore
+
+from trustyroles.arpd_update.arpd_update import policy_hash
+
+LOGGER = logging.getLogger("IAM-ROLE-TRUST-POLICY")
+
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+MMAP_SIZE = 256 * 1024 * 1024
+REFRESHED_AT = "refreshed_at:"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS roles (
+    role_name TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    arn TEXT NOT NULL,
+    policy TEXT NOT NULL,
+    policy_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS trusted_arns (
+    arn TEXT NOT NULL,
+    role_name TEXT NOT NULL REFERENCES roles(role_name) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS trusted_arns_arn ON trusted_arns(arn);
+CREATE INDEX IF NOT EXISTS trusted_arns_role ON trusted_arns(role_name);
+CREATE INDEX IF NOT EXISTS roles_path ON roles(path);
+"""
+
+
+def open_snapshot(db_path: str) -> sqlite3.Connection:
+    """
+    The open_snapshot method opens or creates a snapshot file.
+    Reads are served from a memory map of the file.
+    """
+
+    connection = sqlite3.connect(db_path)
+    connection.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    connection.execute("PRAGMA foreign_keys=ON")
+    connection.executescript(SCHEMA)
+
+    return connection
+
+
+def _trusted_arns(policy: Dict) -> Iterable[str]:
+    for statement in policy.get("Statement", []):
+        principal = statement.get("Principal", {})
+        arns = principal.get("AWS", []) if isinstance(principal, dict) else []
+
+        if isinstance(arns, str):
+            arns = [arns]
+
+        for arn in arns:
+            yield arn
+
+
+def refresh_snapshot(
+    db_path: str, path_prefix: str = "/", session=None, client=None
+) -> int:
+    """
+    The refresh_snapshot method replaces the roles under path_prefix in the
+    snapshot with the current roles of the account and returns their count.
+    """
+
+    if session:
+        iam_client = session.client("iam")
+    elif client:
+        iam_client = client
+    else:
+        iam_client = boto3.client("iam")
+
+    paginator = iam_client.get_paginator("list_roles")
+    count = 0
+
+    with open_snapshot(db_path) as connection:
+        connection.execute(
+            "DELETE FROM roles WHERE substr(path, 1, ?) = ?",
+            (len(path_prefix), path_prefix),
+        )
+
+        for page in paginator.paginate(PathPrefix=path_prefix):
+            for role in page["Roles"]:
+                policy = role["AssumeRolePolicyDocument"]
+
+                connection.execute(
+                    "DELETE FROM trusted_arns WHERE role_name = ?", (role["RoleName"],)
+                )
+                connection.execute(
+                    "INSERT OR REPLACE INTO roles VALUES (?, ?, ?, ?, ?)",
+                    (
+                        role["RoleName"],
+                        role["Path"],
+                        role["Arn"],
+                        json.dumps(policy),
+                        policy_hash(policy),
+                    ),
+                )
+                connection.executemany(
+                    "INSERT INTO trusted_arns VALUES (?, ?)",
+                    [(arn, role["RoleName"]) for arn in _trusted_arns(policy)],
+                )
+                count += 1
+
+        connection.execute(
+            "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+            (REFRESHED_AT + path_prefix, datetime.utcnow().strftime(TIME_FORMAT)),
+        )
+
+    connection.close()
+    LOGGER.info("Refreshed %s roles under %s in %s", count, path_prefix, db_path)
+
+    return count
+
+
+def snapshot_age(db_path: str, path: str = "/") -> Optional[float]:
+    """
+    The snapshot_age method returns the seconds since the roles under path were
+    last refreshed, by a refresh of path or of a prefix of it, or None if they
+    never were. Each path prefix keeps its own refresh time.
+    """
+
+    connection = open_snapshot(db_path)
+    rows = connection.execute(
+        "SELECT key, value FROM meta WHERE substr(key, 1, ?) = ?",
+        (len(REFRESHED_AT), REFRESHED_AT),
+    ).fetchall()
+    connection.close()
+
+    refreshed = [
+        value for key, value in rows if path.startswith(key[len(REFRESHED_AT) :])
+    ]
+
+    if not refreshed:
+        return None
+
+    refreshed_at = datetime.strptime(max(refreshed), TIME_FORMAT)
+
+    return (datetime.utcnow() - refreshed_at).total_seconds()
+
+
+def snapshot_get_role(db_path: str, role_name: str) -> Dict:
+    """
+    The snapshot_get_role method returns the role_name, path, arn and policy
+    of role_name from the snapshot. Raises KeyError if the role is not in it.
+    """
+
+    connection = open_snapshot(db_path)
+    row = connection.execute(
+        "SELECT role_name, path, arn, policy FROM roles WHERE role_name = ?",
+        (role_name,),
+    ).fetchone()
+    connection.close()
+
+    if not row:
+        raise KeyError(f"Role {role_name} is not in snapshot {db_path}")
+
+    return {
+        "role_name": row[0],
+        "path": row[1],
+        "arn": row[2],
+        "policy": json.loads(row[3]),
+    }
+
+
+def snapshot_get_arpd(db_path: str, role_name: str) -> Dict:
+    """
+    The snapshot_get_arpd method returns the assume role policy document
+    of role_name from the snapshot. Raises KeyError if the role is not in it.
+    """
+
+    return snapshot_get_role(db_path, role_name)["policy"]
+
+
+def find_trusting_roles(db_path: str, arn_list: List) -> Dict[str, Dict]:
+    """
+    The find_trusting_roles method returns {role_name: policy} for
+    the roles in the snapshot trusting any ARN of arn_list.
+    """
+
+    if not arn_list:
+        return {}
+
+    connection = open_snapshot(db_path)
+    rows = connection.execute(
+        "SELECT role_name, policy FROM roles WHERE role_name IN "
+        "(SELECT role_name FROM trusted_arns WHERE arn IN (%s)) ORDER BY role_name"
+        % ", ".join("?" * len(arn_list)),
+        arn_list,
+    ).fetchall()
+    connection.close()
+
+    return {role_name: json.loads(policy) for role_name, policy in rows}
@@ -0,0 +1,47 @@
+"""
+conftest holds the policy helpers and the mocked IAM client
+shared by the arpd_update tests.
+"""
+import json
+import boto3  # type: ignore
+import moto  # type: ignore
+import pytest  # type: ignore
+
+
+def make_policy(*arns, sid=None):
+    statement = {
+        "Effect": "Allow",
+        "Principal": {"AWS": list(arns)},
+        "Action": "sts:AssumeRole",
+    }
+    if sid:
+        statement["Sid"] = sid
+
+    return {"Version": "2012-10-17", "Statement": [statement]}
+
+
+initial_policy = make_policy("arn:aws:iam:::user/test-role1")
+
+
+@pytest.fixture
+def role_names():
+    """
+    The roles created by iam_client, overridden per test module. Each is a
+    role name with initial_policy, or the keyword arguments of create_role.
+    """
+
+    return []
+
+
+@pytest.fixture
+def iam_client(role_names):
+    with moto.mock_iam():
+        iam = boto3.client("iam", region_name="us-east-1")
+        for role in role_names:
+            if isinstance(role, str):
+                role = {"RoleName": role}
+
+            iam.create_role(
+                **dict({"AssumeRolePolicyDocument": json.dumps(initial_policy)}, **role)
+            )
+        yield iam
@@ -0,0 +1,138 @@
+"""
+simulated_aws wraps moto's IAM and S3 mocks with per-call latency, jitter,
+throttling and transient failures, to load-test the parallel code paths.
+"""
+import io
+import time
+import random
+import threading
+from collections import Counter
+
+from typing import Optional
+import boto3  # type: ignore
+import moto  # type: ignore
+from botocore.awsrequest import AWSResponse  # type: ignore
+from moto.core.models import botocore_stubber  # type: ignore
+
+ERRORS = {
+    "iam": {
+        "throttle": (400, "Throttling", "Rate exceeded"),
+        "failure": (500, "ServiceFailure", "Request failed for an unknown reason"),
+    },
+    "s3": {
+        "throttle": (503, "SlowDown", "Please reduce your request rate."),
+        "failure": (500, "InternalError", "We encountered an internal error."),
+    },
+}
+
+
+class _RawResponse(io.BytesIO):
+    def stream(self, **kwargs):
+        contents = self.read()
+        while contents:
+            yield contents
+            contents = self.read()
+
+
+def _error_body(service: str, code: str, message: str) -> bytes:
+    error = f"<Code>{code}</Code><Message>{message}</Message>"
+
+    if service == "s3":
+        return f"<Error>{error}</Error>".encode()
+
+    return (
+        f"<ErrorResponse><Error><Type>Sender</Type>{error}</Error>"
+        "<RequestId>simulated</RequestId></ErrorResponse>"
+    ).encode()
+
+
+class SimulatedAWS:
+    """
+    The SimulatedAWS context manager mocks IAM and S3 with moto. IAM and S3
+    clients made by its client method, or from the default boto3 session while
+    it is active, wait latency +/- jitter seconds per HTTP attempt and fail
+    throttle_rate of attempts with throttling errors and failure_rate with
+    transient server errors, before botocore's retries. Clients of other
+    sessions are only mocked. Counts of attempts, throttles and failures per
+    operation are kept in stats.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        throttle_rate: float = 0.0,
+        failure_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.failure_rate = failure_rate
+        self.stats = Counter()  # type: Counter
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._mocks = [moto.mock_iam(), moto.mock_s3()]
+        self._default_session = None
+
+    def __enter__(self) -> "SimulatedAWS":
+        for mock in self._mocks:
+            mock.start()
+
+        # clients take the handlers of their session when they are created
+        self._default_session = boto3.DEFAULT_SESSION
+        boto3.setup_default_session(region_name="us-east-1")
+        self._instrument(boto3.DEFAULT_SESSION.events)
+
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        boto3.DEFAULT_SESSION = self._default_session
+
+        for mock in reversed(self._mocks):
+            mock.stop()
+
+    def client(self, service: str, **kwargs):
+        """The client method returns a boto3 client for iam or s3 with injected faults."""
+
+        kwargs.setdefault("region_name", "us-east-1")
+
+        return boto3.client(service, **kwargs)
+
+    def _instrument(self, events) -> None:
+        # moto answers through _before_send, so faulted requests never reach it
+        events.unregister("before-send", botocore_stubber)
+        events.register("before-send", self._before_send)
+
+    def _before_send(self, request, event_name: str, **kwargs):
+        _, service, operation = event_name.split(".")
+
+        if service not in ERRORS:
+            return botocore_stubber(event_name=event_name, request=request, **kwargs)
+
+        with self._lock:
+            delay = self.latency + self._random.uniform(-self.jitter, self.jitter)
+            roll = self._random.random()
+            self.stats[f"{operation}.attempts"] += 1
+
+        if delay > 0:
+            time.sleep(delay)
+
+        if roll < self.throttle_rate:
+            fault = "throttle"
+        elif roll < self.throttle_rate + self.failure_rate:
+            fault = "failure"
+        else:
+            return botocore_stubber(event_name=event_name, request=request, **kwargs)
+
+        with self._lock:
+            self.stats[f"{operation}.{fault}"] += 1
+
+        status, code, message = ERRORS[service][fault]
+
+        return AWSResponse(
+            request.url,
+            status,
+            {},
+            _RawResponse(_error_body(service, code, message)),
+        )
@@ -0,0 +1,76 @@
+import io
+import pytest  # type: ignore
+from trustyroles.arpd_update import batch  # type: ignore
+
+
+@pytest.fixture
+def role_names():
+    return [f"batch-role-{index}" for index in range(5)]
+
+
+def test_read_records():
+    stream = io.StringIO(
+        '{"update_role": "batch-role-0", "method": "get"}\n\nnot json\n[1]\n'
+    )
+    records = list(batch.read_records(stream))
+
+    assert records[0] == {"update_role": "batch-role-0", "method": "get", "line": 1}
+    assert records[1]["line"] == 3 and "invalid" in records[1]
+    assert records[2]["line"] == 4 and "invalid" in records[2]
+
+
+def test_run_batch(iam_client):
+    records = (
+        {
+            "line": index,
+            "update_role": f"batch-role-{index}",
+            "method": "update",
+            "arn": "arn:aws:iam:::user/test-role2",
+        }
+        for index in range(5)
+    )
+    results = list(batch.run_batch(records, max_workers=2, client=iam_client))
+
+    assert sorted(result["line"] for result in results) == list(range(5))
+    assert all(result["status"] == "ok" for result in results)
+    assert results[0]["policy"]["Statement"][0]["Principal"]["AWS"] == [
+        "arn:aws:iam:::user/test-role1",
+        "arn:aws:iam:::user/test-role2",
+    ]
+
+
+def test_run_batch_errors(iam_client):
+    records = [
+        {"line": 1, "update_role": "missing-role", "method": "get"},
+        {"line": 2, "update_role": "batch-role-0", "method": "restore"},
+        {"line": 3, "invalid": "Invalid JSON"},
+        {"line": 4, "update_role": "batch-role-0", "add_sid": "1"},
+    ]
+    results = {
+        result["line"]: result
+        for result in batch.run_batch(records, max_workers=2, client=iam_client)
+    }
+
+    assert results[1]["status"] == "error"
+    assert results[2]["status"] == "error"
+    assert results[3]["status"] == "error"
+    assert results[4]["status"] == "ok"
+    assert results[4]["policy"]["Statement"][0]["Sid"] == "1"
+
+
+def test_run_batch_result_per_operation(iam_client):
+    records = [
+        {
+            "line": 1,
+            "update_role": "batch-role-1",
+            "method": "update",
+            "arn": "arn:aws:iam:::user/test-role2",
+            "add_sid": "1",
+        },
+        {"line": 2, "update_role": "batch-role-2", "add_sid": "2", "remove_sid": True},
+    ]
+    results = list(batch.run_batch(records, max_workers=2, client=iam_client))
+    methods = sorted((result["line"], result["method"]) for result in results)
+
+    assert methods == [(1, "add_sid"), (1, "update"), (2, "add_sid"), (2, "remove_sid")]
+    assert all(result["status"] == "ok" for result in results)
@@ -0,0 +1,103 @@
+import pytest  # type: ignore
+from trustyroles.arpd_update import batch, journal  # type: ignore
+from trustyroles.arpd_update.tests.conftest import (  # type: ignore
+    initial_policy,
+    make_policy,
+)
+
+
+@pytest.fixture
+def role_names():
+    return [f"journal-role-{index}" for index in range(3)]
+
+
+def update_records(count):
+    return [
+        {
+            "line": index,
+            "update_role": f"journal-role-{index}",
+            "method": "update",
+            "arn": "arn:aws:iam:::user/test-role2",
+        }
+        for index in range(count)
+    ]
+
+
+def live_policy(iam_client, role_name):
+    return iam_client.get_role(RoleName=role_name)["Role"]["AssumeRolePolicyDocument"]
+
+
+def test_record_first_wins(tmp_path):
+    spill_path = str(tmp_path / "undo.jsonl")
+    undo = journal.UndoJournal(spill_path)
+    undo.record("journal-role-0", initial_policy)
+    undo.record("journal-role-0", make_policy())
+    undo.record("journal-role-1", make_policy())
+    undo.close()
+
+    undo = journal.UndoJournal.load(spill_path)
+
+    assert undo.roles() == ["journal-role-0", "journal-role-1"]
+    assert undo.pre_image("journal-role-0") == initial_policy
+    assert undo.pre_image("journal-role-1") == make_policy()
+
+
+def test_rollback(iam_client, tmp_path):
+    spill_path = str(tmp_path / "undo.jsonl")
+    undo = journal.UndoJournal(spill_path)
+    results = list(batch.run_batch(update_records(2), client=iam_client, journal=undo))
+    undo.close()
+
+    assert all(result["status"] == "ok" for result in results)
+    assert live_policy(iam_client, "journal-role-0") != initial_policy
+
+    undo = journal.UndoJournal.load(spill_path)
+    results = undo.rollback(client=iam_client)
+
+    assert sorted(result["update_role"] for result in results) == [
+        "journal-role-0",
+        "journal-role-1",
+    ]
+    assert all(result["result"] == "reverted" for result in results)
+    assert live_policy(iam_client, "journal-role-0") == initial_policy
+    assert len(undo) == 0
+
+    undo.close()
+
+    assert len(journal.UndoJournal.load(spill_path)) == 0
+
+
+def test_run_batch_rollback_on_error(iam_client):
+    records = update_records(3) + [
+        {"line": 3, "update_role": "missing-role", "method": "update", "arn": "x"}
+    ]
+    results = list(batch.run_batch(records, client=iam_client, rollback_on_error=True))
+    rollbacks = [result for result in results if result["method"] == "rollback"]
+
+    assert len(rollbacks) == 3
+    assert all(result["result"] == "reverted" for result in rollbacks)
+    for index in range(3):
+        assert live_policy(iam_client, f"journal-role-{index}") == initial_policy
+
+
+def test_run_batch_rollback_on_error_keeps_earlier_batches(iam_client, tmp_path):
+    spill_path = str(tmp_path / "undo.jsonl")
+    undo = journal.UndoJournal(spill_path)
+    list(batch.run_batch(update_records(1), client=iam_client, journal=undo))
+    after_first_batch = live_policy(iam_client, "journal-role-0")
+
+    records = update_records(2) + [
+        {"line": 2, "update_role": "missing-role", "method": "update", "arn": "x"}
+    ]
+    results = list(
+        batch.run_batch(
+            records, client=iam_client, journal=undo, rollback_on_error=True
+        )
+    )
+    rollbacks = [result for result in results if result["method"] == "rollback"]
+    undo.close()
+
+    assert len(rollbacks) == 2
+    assert live_policy(iam_client, "journal-role-0") == after_first_batch
+    assert live_policy(iam_client, "journal-role-1") == initial_policy
+    assert journal.UndoJournal.load(spill_path).roles() == ["journal-role-0"]
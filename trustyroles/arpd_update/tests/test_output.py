@@ -0,0 +1,86 @@
+import io
+import json
+import time
+from trustyroles.arpd_update import output  # type: ignore
+
+policy = {
+    "Version": "2012-10-17",
+    "Statement": [
+        {
+            "Effect": "Allow",
+            "Principal": {"AWS": ["arn:aws:iam:::user/test-role1"]},
+            "Action": "sts:AssumeRole",
+        },
+        {
+            "Effect": "Allow",
+            "Principal": {"Service": "ec2.amazonaws.com"},
+            "Action": "sts:AssumeRole",
+        },
+    ],
+}
+
+
+def test_make_result():
+    result = output.make_result("test-123", "get", time.perf_counter(), policy)
+
+    assert result["status"] == "ok"
+    assert result["policy"] == policy
+    assert result["elapsed_ms"] >= 0
+    assert "error" not in result
+
+    result = output.make_result(
+        "test-123", "get", time.perf_counter(), error="NoSuchEntity", line=3
+    )
+
+    assert result["status"] == "error"
+    assert result["line"] == 3
+    assert "policy" not in result
+
+
+def test_write_result_ndjson():
+    stream = io.StringIO()
+    for role_name in ["test-1", "test-2"]:
+        output.write_result(
+            output.make_result(role_name, "get", time.perf_counter(), policy),
+            "ndjson",
+            stream,
+        )
+
+    lines = stream.getvalue().splitlines()
+
+    assert len(lines) == 2
+    assert " " not in lines[0].replace("sts:AssumeRole", "")
+    assert json.loads(lines[1])["update_role"] == "test-2"
+    assert json.loads(lines[1])["policy"] == policy
+
+
+def test_write_result_text():
+    stream = io.StringIO()
+    output.write_result(
+        output.make_result("test-123", "get", time.perf_counter(), policy),
+        stream=stream,
+        arns_only=True,
+    )
+
+    assert stream.getvalue() == (
+        "test-123 get ok\n\nARNS:\n  arn:aws:iam:::user/test-role1\nConditions:\n"
+    )
+
+    stream = io.StringIO()
+    output.write_result(
+        output.make_result(
+            "test-123", "restore", time.perf_counter(), policy, result="restored"
+        ),
+        stream=stream,
+    )
+    output.write_result(
+        output.make_result(
+            "test-456", "update", time.perf_counter(), error="NoSuchEntity", line=2
+        ),
+        stream=stream,
+    )
+    lines = stream.getvalue().splitlines()
+
+    assert lines[0] == "test-123 restore ok result=restored"
+    assert json.loads("\n".join(lines[1:-1])) == policy["Statement"][0]
+    assert lines[-1] == "test-456 update error line=2: NoSuchEntity"
@@ -0,0 +1,49 @@
+import pstats
+import pytest  # type: ignore
+from trustyroles.arpd_update import arpd_update, profiling  # type: ignore
+
+
+@pytest.fixture
+def role_names():
+    return ["profile-role"]
+
+
+def test_phase_without_profiler():
+    with profiling.phase("output"):
+        pass
+
+    assert profiling._ACTIVE is None
+
+
+def test_boto3_import_time():
+    wall, cpu = arpd_update.BOTO3_IMPORT_TIME
+
+    assert wall > 0 and cpu >= 0
+
+
+def test_profile(iam_client, tmp_path):
+    dump_path = str(tmp_path / "arpd.prof")
+
+    with profiling.profile(dump_path=dump_path) as profiler:
+        profiler.instrument(iam_client)
+        arpd_update.add_sid(
+            role_name="profile-role",
+            sid="1",
+            dir_path=str(tmp_path),
+            client=iam_client,
+            backup_policy="local",
+        )
+
+    iam_client.get_role(RoleName="profile-role")
+
+    assert profiler.phases["aws iam.GetRole"][0] == 1
+    assert profiler.phases["aws iam.UpdateAssumeRolePolicy"][0] == 1
+    assert profiler.phases["backup file"][0] == 1
+    assert profiler.phases["json"][0] == 1
+    assert profiling._ACTIVE is None
+
+    report = profiler.report(limit=3)
+
+    assert "aws iam.GetRole" in report
+    assert len(report.split("\n\n")[1].splitlines()) == 4
+    assert pstats.Stats(dump_path).total_calls > 0
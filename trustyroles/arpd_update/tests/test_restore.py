@@ -0,0 +1,98 @@
+import json
+import pytest  # type: ignore
+from trustyroles.arpd_update import restore, retention  # type: ignore
+from trustyroles.arpd_update.tests.conftest import make_policy  # type: ignore
+
+
+@pytest.fixture
+def role_names():
+    return [
+        {
+            "RoleName": f"restore-role-{index}",
+            "AssumeRolePolicyDocument": json.dumps(
+                make_policy("arn:aws:iam:::user/bad")
+            ),
+        }
+        for index in range(4)
+    ]
+
+
+def write_backup(dir_path, timestamp, role_name, policy):
+    with open(dir_path / f"{timestamp}.{role_name}.bk", "w") as file:
+        json.dump(policy, file)
+
+
+def test_bulk_restore(iam_client, tmp_path):
+    good = make_policy("arn:aws:iam:::user/good")
+    older = make_policy("arn:aws:iam:::user/older")
+    # restore-role-0 was edited twice since the restore time
+    write_backup(tmp_path, "2020-01-01T00:00:00Z", "restore-role-0", older)
+    write_backup(tmp_path, "2020-01-02T10:00:00Z", "restore-role-0", good)
+    write_backup(tmp_path, "2020-01-02T11:00:00Z", "restore-role-0", older)
+    # restore-role-1 already matches its backup
+    write_backup(
+        tmp_path,
+        "2020-01-02T10:00:00Z",
+        "restore-role-1",
+        make_policy("arn:aws:iam:::user/bad"),
+    )
+    # restore-role-2 was not edited since the restore time
+    write_backup(tmp_path, "2020-01-01T00:00:00Z", "restore-role-2", good)
+    # restore-role-3 is compacted
+    write_backup(tmp_path, "2020-01-01T00:00:00Z", "restore-role-3", older)
+    write_backup(tmp_path, "2020-01-02T10:00:00Z", "restore-role-3", good)
+    retention.compact_backups("local", dir_path=str(tmp_path))
+
+    results = {
+        result["update_role"]: result
+        for result in restore.bulk_restore(
+            "2020-01-02T09:00:00Z",
+            "local",
+            role_names=[f"restore-role-{index}" for index in range(4)] + ["missing"],
+            dir_path=str(tmp_path),
+            max_workers=2,
+            client=iam_client,
+        )
+    }
+
+    assert results["restore-role-0"]["result"] == "restored"
+    assert results["restore-role-0"]["backup"] == "2020-01-02T10:00:00Z"
+    assert results["restore-role-1"]["result"] == "skipped"
+    assert results["restore-role-2"]["result"] == "unchanged"
+    assert results["restore-role-3"]["result"] == "restored"
+    assert results["missing"]["status"] == "error"
+
+    for role_name in ["restore-role-0", "restore-role-3"]:
+        role = iam_client.get_role(RoleName=role_name)
+        assert role["Role"]["AssumeRolePolicyDocument"] == good
+
+
+def test_bulk_restore_after_retention(iam_client, tmp_path):
+    write_backup(
+        tmp_path,
+        "2020-01-01T00:00:00Z",
+        "restore-role-0",
+        make_policy("arn:aws:iam:::user/p"),
+    )
+    write_backup(
+        tmp_path,
+        "2020-01-05T00:00:00Z",
+        "restore-role-0",
+        make_policy("arn:aws:iam:::user/q"),
+    )
+    retention.compact_backups("local", dir_path=str(tmp_path), keep_last=1)
+
+    def restore_to(timestamp):
+        return list(
+            restore.bulk_restore(
+                timestamp, "local", dir_path=str(tmp_path), client=iam_client
+            )
+        )[0]
+
+    assert restore_to("2019-12-01T00:00:00Z")["status"] == "error"
+    assert restore_to("2020-01-01T00:00:00Z")["status"] == "error"
+    assert restore_to("2020-01-02T00:00:00Z")["result"] == "restored"
+
+    # compacting again keeps the removed range
+    retention.compact_backups("local", dir_path=str(tmp_path))
+    assert restore_to("2019-12-01T00:00:00Z")["status"] == "error"
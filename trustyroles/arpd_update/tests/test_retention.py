@@ -0,0 +1,125 @@
+import json
+import moto  # type: ignore
+import pytest  # type: ignore
+from datetime import datetime
+from trustyroles.arpd_update import retention  # type: ignore
+from trustyroles.arpd_update.tests.conftest import make_policy  # type: ignore
+
+versions = [
+    ("2020-01-01T00:00:00Z", make_policy("arn:aws:iam:::user/a")),
+    ("2020-01-02T00:00:00Z", make_policy("arn:aws:iam:::user/a")),
+    (
+        "2020-01-03T00:00:00Z",
+        make_policy("arn:aws:iam:::user/a", "arn:aws:iam:::user/b"),
+    ),
+    ("2020-01-04T00:00:00Z", make_policy("arn:aws:iam:::user/b")),
+    ("2020-01-05T00:00:00Z", make_policy("arn:aws:iam:::user/b", sid="1")),
+    ("2020-01-06T00:00:00Z", {"Version": "2008-10-17", "Statement": []}),
+]
+
+
+def write_backups(dir_path, role_name="test-role"):
+    for timestamp, policy in versions:
+        with open(dir_path / f"{timestamp}.{role_name}.bk", "w") as file:
+            json.dump(policy, file)
+
+
+def test_parse_backup_name():
+    assert retention.parse_backup_name("2020-01-01T00:00:00Z.my.role.bk") == (
+        "2020-01-01T00:00:00Z",
+        "my.role",
+    )
+    assert retention.parse_backup_name("my-role.bkh") is None
+
+
+def test_encode_decode_history():
+    history = retention.encode_history("test-role", versions)
+    ops = [delta["ops"][0]["op"] for delta in history["deltas"]]
+
+    assert ops == ["arns", "arns", "statement", "replace"]
+    assert history["deltas"][0]["ops"][0]["add"] == ["arn:aws:iam:::user/b"]
+    assert retention.decode_history(history) == versions[1:]
+
+
+def test_policy_delta_any_principal():
+    old = make_policy("arn:aws:iam:::user/a")
+    new = make_policy()
+    new["Statement"][0]["Principal"] = "*"
+
+    assert retention.policy_delta(old, new) == [
+        {"op": "statement", "index": 0, "value": new["Statement"][0]}
+    ]
+    assert retention.apply_delta(new, retention.policy_delta(new, old)) == old
+
+
+def test_apply_retention():
+    now = datetime(2020, 1, 6, 12)
+
+    assert retention.apply_retention(versions, keep_last=2) == versions[-2:]
+    assert retention.apply_retention(versions, max_age_days=2, now=now) == versions[-2:]
+    assert retention.apply_retention(versions, keep_last=0) == versions[-1:]
+    assert retention.apply_retention(versions, max_age_days=0, now=now) == versions[-1:]
+
+
+def test_compact_backups_local(tmp_path):
+    write_backups(tmp_path)
+
+    summary = retention.compact_backups("local", dir_path=str(tmp_path))
+
+    assert summary == {"test-role": {"versions": 5, "deltas": 4, "removed": 6}}
+    assert [path.name for path in tmp_path.iterdir()] == ["test-role.bkh"]
+
+    write_backups(tmp_path)
+    summary = retention.compact_backups("local", dir_path=str(tmp_path), keep_last=3)
+    entry = retention.list_backups("local", dir_path=str(tmp_path))["test-role"]
+
+    assert summary["test-role"]["versions"] == 3
+    assert (
+        retention.load_versions(entry, "local", dir_path=str(tmp_path)) == versions[-3:]
+    )
+
+
+def test_compact_keeps_load_version_since(tmp_path):
+    write_backups(tmp_path)
+    timestamps = [
+        "2019-12-31T00:00:00Z",
+        "2020-01-01T12:00:00Z",
+        "2020-01-02T00:00:00Z",
+        "2020-01-04T12:00:00Z",
+        "2020-01-07T00:00:00Z",
+    ]
+
+    def since(timestamp):
+        entry = retention.list_backups("local", dir_path=str(tmp_path))["test-role"]
+        version = retention.load_version_since(
+            entry, timestamp, "local", dir_path=str(tmp_path)
+        )
+        return version and version[1]
+
+    before = [since(timestamp) for timestamp in timestamps]
+    retention.compact_backups("local", dir_path=str(tmp_path))
+
+    assert [since(timestamp) for timestamp in timestamps] == before
+    assert before[3] == versions[4][1]
+
+
+def test_compact_backups_s3():
+    import boto3  # type: ignore
+
+    with moto.mock_s3():
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket="backups")
+        for timestamp, policy in versions:
+            s3.put_object(
+                Bucket="backups",
+                Key=f"{timestamp}.test-role.bk",
+                Body=json.dumps(policy).encode(),
+            )
+
+        summary = retention.compact_backups("s3", bucket="backups", client=s3)
+        keys = [
+            item["Key"] for item in s3.list_objects_v2(Bucket="backups")["Contents"]
+        ]
+
+        assert summary["test-role"]["removed"] == 6
+        assert keys == ["test-role.bkh"]
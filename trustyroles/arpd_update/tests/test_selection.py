@@ -0,0 +1,61 @@
+import pytest  # type: ignore
+from trustyroles.arpd_update import selection  # type: ignore
+
+roles = [
+    ("/service/", "app-payments", [{"Key": "team", "Value": "payments"}]),
+    ("/service/", "app-search", [{"Key": "team", "Value": "search"}]),
+    ("/service/", "worker-payments", [{"Key": "team", "Value": "payments"}]),
+    ("/", "admin", []),
+]
+
+
+@pytest.fixture
+def role_names():
+    return [
+        {"Path": path, "RoleName": role_name, "Tags": tags}
+        for path, role_name, tags in roles
+    ]
+
+
+def names(selected):
+    return sorted(role["RoleName"] for role in selected)
+
+
+def test_parse_tags():
+    assert selection.parse_tags(["team=payments", "owner", "empty="]) == {
+        "team": "payments",
+        "owner": None,
+        "empty": "",
+    }
+    assert selection.parse_tags(None) == {}
+
+
+def test_list_roles(iam_client):
+    assert names(selection.list_roles("/service/", client=iam_client)) == [
+        "app-payments",
+        "app-search",
+        "worker-payments",
+    ]
+    assert len(list(selection.list_roles(client=iam_client))) == 4
+
+
+def test_select_roles(iam_client):
+    def select(**kwargs):
+        return names(
+            selection.select_roles(
+                selection.list_roles(client=iam_client), client=iam_client, **kwargs
+            )
+        )
+
+    assert select(name_glob="app-*") == ["app-payments", "app-search"]
+    assert select(name_regex="payments$") == ["app-payments", "worker-payments"]
+    assert select(tags={"team": "payments"}, max_workers=1) == [
+        "app-payments",
+        "worker-payments",
+    ]
+    assert select(name_glob="app-*", tags={"team": "payments"}) == ["app-payments"]
+    assert select(tags={"team": None}) == [
+        "app-payments",
+        "app-search",
+        "worker-payments",
+    ]
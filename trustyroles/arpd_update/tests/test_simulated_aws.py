@@ -0,0 +1,167 @@
+import json
+import time
+import pytest  # type: ignore
+from botocore.config import Config  # type: ignore
+from botocore.exceptions import ClientError  # type: ignore
+from trustyroles.arpd_update import batch, journal, restore, selection  # type: ignore
+from trustyroles.arpd_update.tests.conftest import (  # type: ignore
+    initial_policy,
+    make_policy,
+)
+from trustyroles.arpd_update.tests.simulated_aws import SimulatedAWS  # type: ignore
+
+backup_policy = make_policy("arn:aws:iam:::user/test-role2")
+
+no_retries = Config(retries={"total_max_attempts": 1, "mode": "standard"})
+retries = Config(retries={"total_max_attempts": 10, "mode": "standard"})
+
+
+def create_roles(aws, count):
+    iam = aws.client("iam")
+    for index in range(count):
+        iam.create_role(
+            RoleName=f"sim-role-{index}",
+            AssumeRolePolicyDocument=json.dumps(initial_policy),
+        )
+
+
+def test_throttling():
+    with SimulatedAWS(throttle_rate=1.0) as aws:
+        with pytest.raises(ClientError) as error:
+            aws.client("iam", config=no_retries).list_roles()
+
+        assert error.value.response["Error"]["Code"] == "Throttling"
+
+        with pytest.raises(ClientError) as error:
+            aws.client("s3", config=no_retries).list_buckets()
+
+        assert error.value.response["Error"]["Code"] == "SlowDown"
+        assert aws.stats["ListRoles.throttle"] == 1
+
+
+def test_latency():
+    with SimulatedAWS(latency=0.05, jitter=0.01, seed=1) as aws:
+        iam = aws.client("iam")
+        started = time.perf_counter()
+        iam.list_roles()
+
+        assert time.perf_counter() - started >= 0.04
+        assert aws.stats["ListRoles.attempts"] == 1
+
+
+def test_default_session_faults(monkeypatch):
+    monkeypatch.setenv("AWS_MAX_ATTEMPTS", "1")
+
+    with SimulatedAWS(throttle_rate=1.0) as aws:
+        with pytest.raises(ClientError) as error:
+            list(selection.list_roles())
+
+        assert error.value.response["Error"]["Code"] == "Throttling"
+        assert aws.stats["ListRoles.throttle"] == 1
+
+
+def test_run_batch_under_faults():
+    with SimulatedAWS(
+        latency=0.01, jitter=0.005, throttle_rate=0.05, failure_rate=0.02, seed=2
+    ) as aws:
+        create_roles(aws, 20)
+        records = (
+            {
+                "line": index,
+                "update_role": f"sim-role-{index}",
+                "method": "update",
+                "arn": "arn:aws:iam:::user/test-role2",
+            }
+            for index in range(20)
+        )
+        results = list(
+            batch.run_batch(
+                records, max_workers=8, client=aws.client("iam", config=retries)
+            )
+        )
+
+        assert len(results) == 20
+        assert all(result["status"] == "ok" for result in results)
+        assert aws.stats["UpdateAssumeRolePolicy.attempts"] >= 20
+
+
+def test_run_batch_same_role_under_latency():
+    with SimulatedAWS(latency=0.02, seed=4) as aws:
+        create_roles(aws, 2)
+        records = [
+            {
+                "line": index,
+                "update_role": f"sim-role-{index % 2}",
+                "method": "update",
+                "arn": f"arn:aws:iam:::user/u{index}",
+            }
+            for index in range(8)
+        ]
+        iam = aws.client("iam")
+        results = list(batch.run_batch(iter(records), max_workers=4, client=iam))
+
+        assert all(result["status"] == "ok" for result in results)
+
+        for index in range(2):
+            policy = iam.get_role(RoleName=f"sim-role-{index}")["Role"][
+                "AssumeRolePolicyDocument"
+            ]
+            assert policy["Statement"][0]["Principal"]["AWS"] == [
+                "arn:aws:iam:::user/test-role1"
+            ] + [f"arn:aws:iam:::user/u{line}" for line in range(index, 8, 2)]
+
+
+def test_bulk_restore_under_faults():
+    with SimulatedAWS(
+        latency=0.01, throttle_rate=0.05, failure_rate=0.02, seed=3
+    ) as aws:
+        create_roles(aws, 10)
+        s3 = aws.client("s3", config=retries)
+        s3.create_bucket(Bucket="backups")
+        for index in range(10):
+            s3.put_object(
+                Bucket="backups",
+                Key=f"2020-01-02T00:00:00Z.sim-role-{index}.bk",
+                Body=json.dumps(backup_policy).encode(),
+            )
+
+        results = list(
+            restore.bulk_restore(
+                "2020-01-01T00:00:00Z",
+                "s3",
+                bucket="backups",
+                max_workers=4,
+                client=aws.client("iam", config=retries),
+                s3_client=s3,
+            )
+        )
+
+        assert len(results) == 10
+        assert all(result["result"] == "restored" for result in results)
+
+
+def test_rollback_under_faults():
+    with SimulatedAWS(
+        latency=0.01, throttle_rate=0.05, failure_rate=0.02, seed=5
+    ) as aws:
+        create_roles(aws, 10)
+        iam = aws.client("iam", config=retries)
+        undo = journal.UndoJournal()
+        records = (
+            {
+                "line": index,
+                "update_role": f"sim-role-{index}",
+                "method": "update",
+                "arn": "arn:aws:iam:::user/test-role2",
+            }
+            for index in range(10)
+        )
+        list(batch.run_batch(records, max_workers=4, client=iam, journal=undo))
+        results = undo.rollback(max_workers=4, client=iam)
+
+        assert len(results) == 10
+        assert all(result["result"] == "reverted" for result in results)
+        assert aws.stats["UpdateAssumeRolePolicy.attempts"] >= 20
+        for index in range(10):
+            role = iam.get_role(RoleName=f"sim-role-{index}")
+            assert role["Role"]["AssumeRolePolicyDocument"] == initial_policy
@@ -0,0 +1,96 @@
+import json
+import pytest  # type: ignore
+from trustyroles.arpd_update import arpd_update, snapshot  # type: ignore
+from trustyroles.arpd_update.tests.conftest import make_policy  # type: ignore
+
+
+@pytest.fixture
+def role_names():
+    return [
+        {
+            "RoleName": "snapshot-role-1",
+            "Path": "/service/",
+            "AssumeRolePolicyDocument": json.dumps(make_policy("arn:aws:iam:::user/a")),
+        },
+        {
+            "RoleName": "snapshot-role-2",
+            "AssumeRolePolicyDocument": json.dumps(
+                make_policy("arn:aws:iam:::user/a", "arn:aws:iam:::user/b")
+            ),
+        },
+    ]
+
+
+def test_policy_hash():
+    assert arpd_update.policy_hash({"a": 1, "b": [1, 2]}) == arpd_update.policy_hash(
+        json.loads('{"b": [1, 2], "a": 1}')
+    )
+    assert arpd_update.policy_hash({"b": [1, 2]}) != arpd_update.policy_hash(
+        {"b": [2, 1]}
+    )
+
+
+def test_refresh_snapshot(iam_client, tmp_path):
+    db_path = str(tmp_path / "account.db")
+
+    assert snapshot.snapshot_age(db_path) is None
+    assert snapshot.refresh_snapshot(db_path, client=iam_client) == 2
+    assert snapshot.snapshot_age(db_path) < 60
+    assert snapshot.snapshot_get_arpd(db_path, "snapshot-role-1") == make_policy(
+        "arn:aws:iam:::user/a"
+    )
+    assert list(snapshot.find_trusting_roles(db_path, ["arn:aws:iam:::user/a"])) == [
+        "snapshot-role-1",
+        "snapshot-role-2",
+    ]
+    assert list(snapshot.find_trusting_roles(db_path, ["arn:aws:iam:::user/b"])) == [
+        "snapshot-role-2"
+    ]
+
+    with pytest.raises(KeyError):
+        snapshot.snapshot_get_arpd(db_path, "missing-role")
+
+
+def test_snapshot_age_path_prefix(iam_client, tmp_path):
+    db_path = str(tmp_path / "account.db")
+    snapshot.refresh_snapshot(db_path, "/service/", client=iam_client)
+
+    assert snapshot.snapshot_age(db_path) is None
+    assert snapshot.snapshot_age(db_path, "/other/") is None
+    assert snapshot.snapshot_age(db_path, "/service/") < 60
+    assert snapshot.snapshot_age(db_path, "/service/app/") < 60
+    assert snapshot.snapshot_get_role(db_path, "snapshot-role-1")["path"] == "/service/"
+
+
+def test_refresh_snapshot_path_prefix(iam_client, tmp_path):
+    db_path = str(tmp_path / "account.db")
+    snapshot.refresh_snapshot(db_path, client=iam_client)
+    iam_client.update_assume_role_policy(
+        RoleName="snapshot-role-1",
+        PolicyDocument=json.dumps(make_policy("arn:aws:iam:::user/b")),
+    )
+
+    assert snapshot.refresh_snapshot(db_path, "/service/", client=iam_client) == 1
+    assert list(snapshot.find_trusting_roles(db_path, ["arn:aws:iam:::user/b"])) == [
+        "snapshot-role-1",
+        "snapshot-role-2",
+    ]
+    assert list(snapshot.find_trusting_roles(db_path, ["arn:aws:iam:::user/a"])) == [
+        "snapshot-role-2"
+    ]
+
+
+def test_cli_snapshot_get_arpd(iam_client, tmp_path):
+    db_path = str(tmp_path / "account.db")
+    snapshot.refresh_snapshot(db_path, "/service/", client=iam_client)
+    args = {"snapshot": db_path, "max_staleness": 3600}
+
+    assert arpd_update._snapshot_get_arpd(args, "snapshot-role-1") == make_policy(
+        "arn:aws:iam:::user/a"
+    )
+    assert arpd_update._snapshot_get_arpd(args, "snapshot-role-2") is None
+    assert arpd_update._snapshot_get_arpd(args, "missing-role") is None
+    assert (
+        arpd_update._snapshot_get_arpd(dict(args, max_staleness=-1), "snapshot-role-1")
+        is None
+    )